@@ -0,0 +1,251 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+import numpy as np
+
+
+# Rest-frame wavelength ranges (Angstroms) of the bands used for the carousel images
+BANDS = {
+    'h_alpha': (6540, 6580),
+    'sii': (6700, 6750),
+    'oiii': (4850, 5020),
+    'h_beta': (4840, 4880),
+    'nii': (6575, 6595),
+}
+DEFAULT_RGB = ('h_alpha', 'sii', 'oiii')
+PREVIEW_SIZE = 770  # matches the notebook's 10 x 10 inch figures
+THUMB_SIZE = 60
+PLANES_PER_BLOCK = 256  # wavelength planes summed per step while indexing
+
+
+def index_path(filename):
+    return f"{filename}.cumflux.npy"
+
+
+def index_wave_path(filename):
+    return f"{filename}.cumflux.wave.npy"
+
+
+def preview_path(filename):
+    return f"{filename}.png"
+
+
+def thumbnail_path(filename):
+    return f"{filename}.thumb.png"
+
+
+class CumulativeFluxIndex:
+    """Prefix sums of a cube's flux over wavelength: cum[k] = sum of planes [0, k).
+
+    The flux summed over any wavelength range is cum[i2] - cum[i1], two plane reads
+    instead of a pass over every plane in the band. NaNs count as zero, like nansum.
+    """
+
+    def __init__(self, cum, wave):
+        self.cum = cum  # (nwave + 1, ny, nx) float64, usually memory-mapped
+        self.wave = wave
+
+    def band_image(self, band):
+        """(ny, nx) flux summed over a band, given by name or as (start, end) in Angstroms."""
+        start, end = BANDS[band] if isinstance(band, str) else band
+        i1, i2 = np.searchsorted(self.wave, [start, end])
+        if i1 >= i2:
+            return np.zeros(self.cum.shape[1:])
+        return self.cum[i2] - self.cum[i1]
+
+
+def build_index(filename):
+    """Write the cumulative flux index of a LOGCUBE, streaming through the FITS file plane block by plane block."""
+    from astropy.io import fits
+    out_path = index_path(filename)
+    tmp_path = f"{out_path}.tmp-{os.getpid()}-{threading.get_ident()}.npy"
+    with fits.open(filename, memmap=True) as hdul:
+        data = hdul['FLUX'].data
+        nwave, ny, nx = data.shape
+        wave = np.asarray(hdul['WAVE'].data, dtype=np.float64)
+        cum = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(nwave + 1, ny, nx))
+        cum[0] = 0
+        running = np.zeros((ny, nx))
+        for k0 in range(0, nwave, PLANES_PER_BLOCK):
+            k1 = min(k0 + PLANES_PER_BLOCK, nwave)
+            block = np.cumsum(np.nan_to_num(np.asarray(data[k0:k1], dtype=np.float64)), axis=0) + running
+            cum[k0 + 1:k1 + 1] = block
+            running = block[-1]
+        cum.flush()
+        del cum
+    wave_tmp_path = f"{index_wave_path(filename)}.tmp-{os.getpid()}-{threading.get_ident()}.npy"
+    np.save(wave_tmp_path, wave)
+    os.replace(wave_tmp_path, index_wave_path(filename))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def load_index(filename):
+    """Memory-map the index of filename, or None if it is missing or older than the FITS file."""
+    path = index_path(filename)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(filename):
+            return None
+        wave = np.load(index_wave_path(filename))
+    except OSError:
+        return None
+    return CumulativeFluxIndex(np.load(path, mmap_mode='r'), wave)
+
+
+_building = {}  # absolute cube path -> Future of an index build in progress
+_building_lock = threading.Lock()
+
+
+def get_index(filename):
+    """The cube's index, building it first if needed.
+
+    Threads asking for a cube whose index is being built (the frontend's preview build
+    and a band image, say) wait for that build instead of starting their own.
+    """
+    index = load_index(filename)
+    if index is not None:
+        return index
+    key = os.path.abspath(filename)
+    with _building_lock:
+        building = _building.get(key)
+        if building is None:
+            future = _building[key] = Future()
+    if building is not None:
+        building.result()
+        return load_index(filename)
+
+    try:
+        build_index(filename)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(None)
+    finally:
+        with _building_lock:
+            del _building[key]
+    return load_index(filename)
+
+
+# ===== Images =====
+
+def _stretch(channels, pctl=99):
+    """Scale each channel to its maximum, then a shared sqrt stretch up to the highest pctl percentile."""
+    channels = [c / np.max(c) if np.max(c) > 0 else np.zeros_like(c) for c in channels]
+    maximum = max(np.percentile(c, pctl) for c in channels) or 1.0
+    return [np.sqrt(np.clip(c / maximum, 0, 1)) for c in channels]
+
+
+def _to_image(pixels, size):
+    """(ny, nx[, 3]) values in [0, 1] to a size x size RGBA image, drawn with the origin at the bottom."""
+    from PIL import Image
+    pixels = (np.flipud(pixels) * 255).astype(np.uint8)
+    return Image.fromarray(pixels).convert("RGBA").resize((size, size), Image.NEAREST)
+
+
+def rgb_image(index, bands=DEFAULT_RGB, size=PREVIEW_SIZE):
+    """Three bands as red, green and blue, stretched like the notebook's get_cube_image."""
+    r, g, b = _stretch([index.band_image(band) for band in bands])
+    return _to_image(np.dstack([r, g, b]), size)
+
+
+def band_preview(index, band, size=PREVIEW_SIZE, cmap='inferno'):
+    """A single band through a colormap."""
+    from matplotlib import colormaps
+    (values,) = _stretch([index.band_image(band)])
+    return _to_image(colormaps[cmap](values)[..., :3], size)
+
+
+def write_previews(filename, bands=DEFAULT_RGB, size=PREVIEW_SIZE, thumb_size=THUMB_SIZE):
+    """Write <cube>.png and <cube>.thumb.png for one cube; returns the preview path."""
+    index = get_index(filename)
+    image = rgb_image(index, bands, size)
+    image.save(preview_path(filename))
+    thumb = image.copy()
+    thumb.thumbnail((thumb_size, thumb_size))
+    thumb.save(thumbnail_path(filename))
+    return preview_path(filename)
+
+
+def load_thumbnail(png, size=THUMB_SIZE):
+    """Thumbnail of a preview image, cached on disk next to it.
+
+    <cube>.thumb.png is reused while it is at least as new as the preview and has the
+    requested size; otherwise it is rebuilt from the preview (a full decode) and saved.
+    """
+    from PIL import Image
+    thumb_file = thumbnail_path(png[:-4])
+    try:
+        if os.path.getmtime(thumb_file) >= os.path.getmtime(png):
+            thumb = Image.open(thumb_file)
+            if max(thumb.size) == size:
+                thumb.load()
+                return thumb
+    except OSError:
+        pass
+    thumb = Image.open(png)
+    thumb.thumbnail((size, size))
+    try:
+        tmp_file = f"{thumb_file}.tmp-{os.getpid()}.png"
+        thumb.save(tmp_file)
+        os.replace(tmp_file, thumb_file)
+    except OSError:
+        pass  # read-only directory: the thumbnail is still usable
+    return thumb
+
+
+def discover(directory=".", build=False):
+    """Preview images of the galaxies in a directory, sorted by name.
+
+    A cube (*.fits) counts if it has a preview; with build=True, missing or outdated
+    previews are generated. Previews whose cube is absent are still listed.
+    """
+    previews = set(glob.glob(os.path.join(directory, "*.fits.png")))
+    for cube_file in glob.glob(os.path.join(directory, "*.fits")):
+        png = preview_path(cube_file)
+        if build and (png not in previews or os.path.getmtime(png) < os.path.getmtime(cube_file)):
+            write_previews(cube_file)
+            previews.add(png)
+    return sorted(previews)
+
+
+def parse_band(text):
+    """"name=start:end" for a custom band, or the name of a predefined one."""
+    if "=" not in text:
+        if text not in BANDS:
+            raise argparse.ArgumentTypeError(f"unknown band {text!r} (known: {', '.join(BANDS)})")
+        return text
+    name, limits = text.split("=", 1)
+    start, end = (float(v) for v in limits.split(":"))
+    BANDS[name] = (start, end)
+    return name
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build cumulative flux indexes and RGB previews / thumbnails for MaNGA cubes.")
+    parser.add_argument("paths", nargs="+", help="LOGCUBE FITS files or directories of them")
+    parser.add_argument("--bands", nargs=3, type=parse_band, default=DEFAULT_RGB, metavar=("R", "G", "B"),
+                        help=f"bands for red, green and blue: names ({', '.join(BANDS)}) or name=start:end (default: {' '.join(DEFAULT_RGB)})")
+    parser.add_argument("--size", type=int, default=PREVIEW_SIZE, help=f"preview size in pixels (default: {PREVIEW_SIZE})")
+    parser.add_argument("--thumb-size", type=int, default=THUMB_SIZE, help=f"thumbnail size in pixels (default: {THUMB_SIZE})")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    cube_files = []
+    for path in args.paths:
+        cube_files += sorted(glob.glob(os.path.join(path, "*.fits"))) if os.path.isdir(path) else [path]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        bands = tuple(BANDS[band] for band in args.bands)  # as ranges, so custom bands reach the workers
+        futures = {pool.submit(write_previews, f, bands, args.size, args.thumb_size): f for f in cube_files}
+        for future in as_completed(futures):
+            try:
+                print(f"✅ Saved: {future.result()}")
+            except Exception as e:
+                print(f"{futures[future]} failed: {e}", file=sys.stderr)
+    print(f"{len(cube_files)} cubes in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,154 @@
+import os
+import io
+import sys
+import time
+import argparse
+import contextlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+
+def output_path(out_dir, cube_file, x, y):
+    stem = os.path.basename(cube_file).removesuffix(".fits")
+    return os.path.join(out_dir, stem, f"x{x:02d}_y{y:02d}.wav")
+
+
+def valid_mask(cube_file):
+    """Boolean [x, y] map of the spaxels with data, indexed like cube.get_spectrum(x, y)."""
+    from classify_cube import load_label_cube, UNCLASSIFIED
+    labels = load_label_cube(cube_file)
+    if labels is not None:
+        return labels[:, :, 0] != UNCLASSIFIED
+    from astropy.io import fits
+    with fits.open(cube_file, memmap=True) as hdul:
+        return np.any(hdul['IVAR'].data > 0, axis=0)
+
+
+def valid_spaxels(cube_file):
+    """(x, y) of every spaxel with data, in cube.get_spectrum(x, y) order."""
+    return [tuple(xy) for xy in np.argwhere(valid_mask(cube_file)).tolist()]
+
+
+def read_coords(path):
+    """One spaxel per line as "x y" or "x,y"; blank lines and # comments are skipped."""
+    coords = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#")[0].replace(",", " ").split()
+            if line:
+                coords.append((int(line[0]), int(line[1])))
+    return coords
+
+
+def select_spaxels(cube_file, args):
+    if args.coords:
+        return read_coords(args.coords)
+    if args.region:
+        x0, x1, y0, y1 = args.region
+        return [(x, y) for x in range(x0, x1) for y in range(y0, y1)]
+    return valid_spaxels(cube_file)
+
+
+def render_spaxel(cube_file, x, y, out_path, backend, soundfont_path, plot, max_notes=None):
+    """Worker: extract -> classify -> map -> render one spaxel. Returns per-stage seconds."""
+    from spaxel_to_wav import extract_spaxel, classify_spaxel
+    from spectrum import SpaxelSpectrum
+    from spectrum_plot import get_plotter
+    from sonify import note_schedule, RENDER_BACKENDS
+
+    timings = {}
+    # From the spaxel store and label cube when they exist; otherwise this includes the
+    # worker's first cube load (the cube stays resident for its next spaxels)
+    start = time.perf_counter()
+    rest_wav, flux, spec = extract_spaxel(cube_file, x, y)
+    timings["extract"] = time.perf_counter() - start
+
+    # A label cube lookup, or model inference for spaxels it doesn't cover
+    start = time.perf_counter()
+    pred_arr = classify_spaxel(cube_file, x, y, spec)
+    spectrum = SpaxelSpectrum.from_pred_arr(rest_wav, flux, pred_arr, x, y)
+    timings["classify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tracks = note_schedule(spectrum, max_notes=max_notes)
+    timings["map"] = time.perf_counter() - start
+
+    # Private temporary names per worker process; the final file appears atomically
+    start = time.perf_counter()
+    tmp_base = f"{out_path}.{os.getpid()}.tmp"
+    with contextlib.redirect_stdout(io.StringIO()):  # keep per-file messages out of the progress output
+        RENDER_BACKENDS[backend](tracks, f"{tmp_base}.mid", f"{tmp_base}.wav", soundfont_path)
+    if os.path.exists(f"{tmp_base}.mid"):
+        os.remove(f"{tmp_base}.mid")
+    timings["render"] = time.perf_counter() - start
+
+    if plot:
+        start = time.perf_counter()
+        get_plotter().save(spectrum, x, y, f"{tmp_base}.png")
+        os.replace(f"{tmp_base}.png", out_path.removesuffix(".wav") + ".png")
+        timings["plot"] = time.perf_counter() - start
+
+    os.replace(f"{tmp_base}.wav", out_path)
+    return timings
+
+
+def run_batch(cube_files, args):
+    jobs = []
+    skipped = 0
+    for cube_file in cube_files:
+        for x, y in select_spaxels(cube_file, args):
+            out_path = output_path(args.out, cube_file, x, y)
+            # Resume: spaxels whose WAV already exists are done
+            if args.resume and os.path.exists(out_path):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            jobs.append((cube_file, x, y, out_path))
+
+    print(f"{len(jobs)} spaxels to render ({skipped} already done) with {args.workers or os.cpu_count()} workers")
+    from sonify import notes_for_duration
+    max_notes = notes_for_duration(args.duration) if args.duration else None
+    stage_seconds = defaultdict(float)
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Jobs are grouped by cube so each worker reuses the cube it already loaded
+        futures = {pool.submit(render_spaxel, cube_file, x, y, out_path, args.backend, args.soundfont, args.plots, max_notes):
+                   (cube_file, x, y) for cube_file, x, y, out_path in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                for stage, seconds in future.result().items():
+                    stage_seconds[stage] += seconds
+            except Exception as e:
+                failed += 1
+                print(f"\n{futures[future]} failed: {e}", file=sys.stderr)
+            print(f"\r{done}/{len(jobs)}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    rendered = len(jobs) - failed
+    print(f"✅ Rendered {rendered} spaxels in {elapsed:.1f} s ({rendered / elapsed if elapsed else 0:.2f} spaxels/s), {failed} failed")
+    for stage, seconds in stage_seconds.items():
+        print(f"  {stage:8s} {seconds:9.2f} s total  {1000 * seconds / max(rendered, 1):8.1f} ms/spaxel (summed over workers)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sonify many spaxels of MaNGA cubes in parallel, without the GUI.")
+    parser.add_argument("cubes", nargs="+", help="LOGCUBE FITS files")
+    which = parser.add_mutually_exclusive_group()
+    which.add_argument("--coords", help='file with one "x y" spaxel per line')
+    which.add_argument("--region", nargs=4, type=int, metavar=("X0", "X1", "Y0", "Y1"),
+                       help="rectangle of spaxels, X0 <= x < X1 and Y0 <= y < Y1")
+    which.add_argument("--all", action="store_true", help="every spaxel with data (default)")
+    parser.add_argument("-o", "--out", default="atlas", help="output directory (default: atlas)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--backend", default="numpy", help="render backend: numpy, fluidsynth or pool (default: numpy)")
+    parser.add_argument("--soundfont", default="FluidR3_GM.sf2", help="SoundFont for the fluidsynth backends")
+    parser.add_argument("--plots", action="store_true", help="also save a spectrum plot per spaxel")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="decimate each spectrum to about this many seconds of audio (default: one note per sample)")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="re-render spaxels that already have output")
+    args = parser.parse_args()
+
+    run_batch(args.cubes, args)
@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import numpy as np
+
+
+# MaNGA LOGCUBE layout: 4563 log-spaced wavelengths, up to 74x74 spaxels
+NWAVE = 4563
+WAVE_MIN, WAVE_MAX = 3621.6, 10354.4
+
+BENCHMARKS = {}
+
+
+class SkipBenchmark(Exception):
+    pass
+
+
+def benchmark(name):
+    """Register fn(ctx) -> zero-argument callable to time (setup happens in fn)."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+# ===== Synthetic data =====
+
+def synthetic_wave(nwave=NWAVE):
+    return np.logspace(np.log10(WAVE_MIN), np.log10(WAVE_MAX), nwave)
+
+
+def synthetic_spectrum(wave, rng, n_emission=12, n_absorption=10, n_cosmic=3):
+    """Flux plus component labels (0 continuum, 1 emission, 2 absorption, 3 cosmic ray)."""
+    n = len(wave)
+    flux = 5 + np.sin(wave / 300) + rng.normal(0, 0.2, n)
+    labels = np.zeros(n, dtype=np.uint8)
+    for center in rng.integers(0, n - 20, n_emission):
+        labels[center:center + 8] = 1
+        flux[center:center + 8] += 8 * np.hanning(8)
+    for center in rng.integers(0, n - 20, n_absorption):
+        labels[center:center + 15] = 2
+        flux[center:center + 15] -= 2 * np.hanning(15)
+    for center in rng.integers(0, n, n_cosmic):
+        labels[center] = 3
+        flux[center] += 30
+    return flux.astype(np.float32), labels
+
+
+def synthetic_components(seed=0, nwave=NWAVE):
+    """The get_spaxel_spectra tuple for one synthetic spaxel."""
+    wave = synthetic_wave(nwave)
+    flux, labels = synthetic_spectrum(wave, np.random.default_rng(seed))
+    components = [np.where(labels == k, flux, 0).astype(np.float32) for k in range(4)]
+    return (wave, flux, *components)
+
+
+def write_synthetic_cube(path, ny=70, nx=70, nwave=NWAVE, seed=0):
+    """A LOGCUBE-shaped FITS file (FLUX, IVAR, MASK, WAVE) with synthetic spectra."""
+    from astropy.io import fits
+    rng = np.random.default_rng(seed)
+    wave = synthetic_wave(nwave)
+    yy, xx = np.mgrid[:ny, :nx]
+    # Brighter towards the center, like a galaxy
+    profile = np.exp(-((yy - ny / 2) ** 2 + (xx - nx / 2) ** 2) / (2 * (nx / 5) ** 2)).astype(np.float32)
+    template, _ = synthetic_spectrum(wave, rng)
+    flux = template[:, None, None] * profile[None] + rng.normal(0, 0.1, (nwave, ny, nx)).astype(np.float32)
+    ivar = np.full_like(flux, 100.0)
+
+    hdr = fits.Header()
+    hdr.update(CTYPE1='RA---TAN', CTYPE2='DEC--TAN', CTYPE3='WAVE-LOG', CUNIT1='deg', CUNIT2='deg', CUNIT3='Angstrom',
+               CRPIX1=nx / 2, CRPIX2=ny / 2, CRPIX3=1, CRVAL1=180.0, CRVAL2=0.0, CRVAL3=wave[0],
+               CD1_1=-0.5 / 3600, CD2_2=0.5 / 3600, CD3_3=wave[1] - wave[0], BUNIT='1E-17 erg/s/cm^2/Ang/spaxel')
+    fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(flux, header=hdr, name='FLUX'),
+        fits.ImageHDU(ivar, header=hdr, name='IVAR'),
+        fits.ImageHDU(np.zeros(flux.shape, dtype=np.int32), header=hdr, name='MASK'),
+        fits.ImageHDU(wave, name='WAVE'),
+    ]).writeto(path, overwrite=True)
+    return path
+
+
+def _requires(*modules):
+    for module in modules:
+        try:
+            __import__(module)
+        except ImportError as e:
+            raise SkipBenchmark(f"needs {module}") from e
+
+
+# ===== Benchmarks =====
+
+@benchmark("cube_load")
+def bench_cube_load(ctx):
+    _requires("lime", "astropy")
+    from cube_cache import load_manga_cube
+    path = ctx.cube_path()
+    return lambda: load_manga_cube(path)
+
+
+@benchmark("get_spaxel_spectra")
+def bench_get_spaxel_spectra(ctx):
+    _requires("lime", "astropy")
+    from spaxel_to_wav import get_spaxel_spectra
+    path = ctx.cube_path()
+    get_spaxel_spectra(path, 35, 35, plot=False)  # warm the cube cache
+    return lambda: get_spaxel_spectra(path, 35, 35, plot=False)
+
+
+@benchmark("fits_spectrum_read")
+def bench_fits_spectrum_read(ctx):
+    """One spaxel's spectrum straight from the (wavelength, y, x) FITS layout."""
+    _requires("astropy")
+    from astropy.io import fits
+    hdul = fits.open(ctx.cube_path(), memmap=True)
+    ctx.cleanup.append(hdul.close)
+    flux = hdul['FLUX'].data
+    x, y = ctx.shape[0] // 2, ctx.shape[1] // 2
+    return lambda: np.array(flux[:, x, y])
+
+
+@benchmark("store_spectrum_read")
+def bench_store_spectrum_read(ctx):
+    """The same spectrum from the spaxel-major store (spaxel_store.py)."""
+    _requires("astropy")
+    import contextlib
+    import spaxel_store
+    with contextlib.redirect_stdout(sys.stderr):
+        path = spaxel_store.ingest(ctx.cube_path(), os.path.join(ctx.tmp_dir, "synthetic.store"))
+    store = spaxel_store.SpaxelStore(path)
+    x, y = ctx.shape[0] // 2, ctx.shape[1] // 2
+    return lambda: np.array(store.spectrum(x, y)[0])
+
+
+@benchmark("note_schedule")
+def bench_note_schedule(ctx):
+    _requires("mido", "midi2audio")
+    from sonify import note_schedule
+    wave, flux, *components = ctx.spectrum
+    return lambda: note_schedule(wave, *components)
+
+
+@benchmark("build_midi")
+def bench_build_midi(ctx):
+    _requires("mido", "midi2audio")
+    from sonify import note_schedule, build_midi
+    wave, flux, *components = ctx.spectrum
+    tracks = note_schedule(wave, *components)
+    return lambda: build_midi(tracks)
+
+
+@benchmark("synth_numpy")
+def bench_synth_numpy(ctx):
+    _requires("mido", "midi2audio")
+    import synth
+    from sonify import note_schedule, NOTE_DURATION, TICK_SECONDS
+    wave, flux, *components = ctx.spectrum
+    tracks = note_schedule(wave, *components)
+    return lambda: synth.render_tracks(tracks, NOTE_DURATION * TICK_SECONDS, TICK_SECONDS)
+
+
+@benchmark("postprocess")
+def bench_postprocess(ctx):
+    """Silence trimming and normalization of a rendered spectrum (postprocess.py)."""
+    _requires("mido", "midi2audio")
+    import synth
+    import postprocess
+    from sonify import note_schedule, NOTE_DURATION, TICK_SECONDS
+    wave, flux, *components = ctx.spectrum
+    samples = synth.render_tracks(note_schedule(wave, *components), NOTE_DURATION * TICK_SECONDS, TICK_SECONDS)
+    return lambda: postprocess.process(samples)
+
+
+@benchmark("synth_first_chunk")
+def bench_synth_first_chunk(ctx):
+    _requires("mido", "midi2audio")
+    from sonify import stream_spectrum
+    wave, flux, *components = ctx.spectrum
+    return lambda: next(stream_spectrum(wave, *components))
+
+
+@benchmark("synth_fluidsynth")
+def bench_synth_fluidsynth(ctx):
+    _requires("mido", "midi2audio")
+    if shutil.which("fluidsynth") is None or not os.path.exists(ctx.soundfont):
+        raise SkipBenchmark("needs the fluidsynth binary and SoundFont")
+    from sonify import note_schedule, render_fluidsynth
+    wave, flux, *components = ctx.spectrum
+    tracks = note_schedule(wave, *components)
+    midi_path, wav_path = os.path.join(ctx.tmp_dir, "bench.mid"), os.path.join(ctx.tmp_dir, "bench.wav")
+    return lambda: render_fluidsynth(tracks, midi_path, wav_path, ctx.soundfont)
+
+
+@benchmark("sweep_render")
+def bench_sweep_render(ctx):
+    """A whole Out sweep (sweep.py) from a store and label cube; compare with the audio length for real-time margin."""
+    _requires("mido", "midi2audio", "astropy")
+    import contextlib
+    import spaxel_store
+    from classify_cube import label_cube_path
+    from sweep import sweep_steps, render_sweep, StepPool, OUT
+    ny, nx, nwave = ctx.shape
+    path = write_synthetic_cube(os.path.join(ctx.tmp_dir, "sweep-LOGCUBE.fits"), ny, nx, nwave)
+    with contextlib.redirect_stdout(sys.stderr):
+        spaxel_store.ingest(path)
+    # Every spaxel gets the synthetic template's components, as pred_arr classes
+    _, groups = synthetic_spectrum(synthetic_wave(nwave), np.random.default_rng(0))
+    classes = np.array([0, 3, 9, 4], dtype=np.uint8)[groups]
+    np.save(label_cube_path(path), np.broadcast_to(classes, (ny, nx, nwave)))
+    steps = sweep_steps(path, OUT)
+    pool = StepPool()
+    ctx.cleanup.append(pool.shutdown)
+    return lambda: render_sweep(path, steps, executor=pool)
+
+
+@benchmark("feature_maps")
+def bench_feature_maps(ctx):
+    """Every feature map of a cube (feature_maps.py) from a store and label cube: the cost of one cube's heatmaps."""
+    _requires("astropy")
+    import contextlib
+    import spaxel_store
+    from classify_cube import label_cube_path
+    from feature_maps import compute_features
+    ny, nx, nwave = ctx.shape
+    path = write_synthetic_cube(os.path.join(ctx.tmp_dir, "features-LOGCUBE.fits"), ny, nx, nwave)
+    with contextlib.redirect_stdout(sys.stderr):
+        spaxel_store.ingest(path)
+    _, groups = synthetic_spectrum(synthetic_wave(nwave), np.random.default_rng(0))
+    classes = np.array([0, 3, 9, 4], dtype=np.uint8)[groups]
+    np.save(label_cube_path(path), np.broadcast_to(classes, (ny, nx, nwave)))
+    return lambda: compute_features(path)
+
+
+@benchmark("frame_redraw")
+def bench_frame_redraw(ctx):
+    """One animation frame: move the sweep cursor over the galaxy image on a Tk canvas."""
+    _requires("PIL")
+    import tkinter as tk
+    from PIL import Image, ImageTk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise SkipBenchmark("needs a display") from e
+    root.withdraw()
+    canvas = tk.Canvas(root, width=500, height=500)
+    canvas.pack()
+    ctx.cleanup.append(root.destroy)
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (500, 500, 4), dtype=np.uint8))
+    tk_img = ImageTk.PhotoImage(image)
+    canvas.create_image(0, 0, image=tk_img, anchor="nw")
+    line = canvas.create_line(0, 0, 500, 0, fill="white", width=3)
+    step = iter(range(10 ** 9))
+
+    def frame():
+        y = next(step) * 5 % 500
+        canvas.coords(line, 0, y, 500, y)
+        root.update_idletasks()
+    frame.keep = tk_img
+    return frame
+
+
+@benchmark("base_image_decode")
+def bench_base_image_decode(ctx):
+    """Decoding and scaling a carousel PNG, paid once per carousel change."""
+    _requires("PIL")
+    from PIL import Image
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "manga-7443-12703-LOGCUBE.fits.png")
+    if not os.path.exists(path):
+        raise SkipBenchmark("needs the carousel PNGs")
+    return lambda: Image.open(path).convert("RGBA").resize((500, 500))
+
+
+# ===== Runner =====
+
+class Context:
+    def __init__(self, tmp_dir, shape, soundfont):
+        self.tmp_dir = tmp_dir
+        self.shape = shape
+        self.soundfont = soundfont
+        self.spectrum = synthetic_components()
+        self.cleanup = []
+        self._cube_path = None
+
+    def cube_path(self):
+        if self._cube_path is None:
+            ny, nx, nwave = self.shape
+            self._cube_path = write_synthetic_cube(os.path.join(self.tmp_dir, "synthetic-LOGCUBE.fits"), ny, nx, nwave)
+        return self._cube_path
+
+
+def time_callable(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "mean_s": statistics.fmean(times), "repeat": repeat}
+
+
+def run_benchmarks(names, repeat, shape, soundfont):
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix="cosmic-bench-")
+    ctx = Context(tmp_dir, shape, soundfont)
+    try:
+        for name in names:
+            try:
+                fn = BENCHMARKS[name](ctx)
+                results[name] = time_callable(fn, repeat)
+                print(f"{name:22s} {1000 * results[name]['median_s']:10.2f} ms", file=sys.stderr)
+            except SkipBenchmark as e:
+                results[name] = {"skipped": str(e)}
+                print(f"{name:22s}    skipped ({e})", file=sys.stderr)
+            except Exception as e:
+                # Keep going so the other results and the baseline comparison are still written
+                results[name] = {"error": repr(e)}
+                print(f"{name:22s}    failed ({e!r})", file=sys.stderr)
+    finally:
+        for cleanup in ctx.cleanup:
+            cleanup()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def environment():
+    versions = {}
+    for module in ("numpy", "mido", "matplotlib", "lime", "astropy", "PIL"):
+        try:
+            versions[module] = getattr(__import__(module), "__version__", "unknown")
+        except ImportError:
+            versions[module] = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "versions": versions,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, baseline, tolerance):
+    """Print current vs baseline best times; return names slower than baseline by more than tolerance.
+
+    The minimum over the timed runs is compared, being the least sensitive to noise
+    from other processes. A benchmark that failed counts as a regression.
+    """
+    regressions = []
+    print(f"{'benchmark':22s} {'baseline ms':>12s} {'current ms':>12s} {'ratio':>7s}")
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if "error" in current:
+            regressions.append(name)
+            base_ms = f"{1000 * base['min_s']:12.2f}" if base and "min_s" in base else f"{'-':>12s}"
+            print(f"{name:22s} {base_ms} {'error':>12s} {'-':>7s}  REGRESSION ({current['error']})")
+            continue
+        if "min_s" not in current or not base or "min_s" not in base:
+            continue
+        ratio = current["min_s"] / base["min_s"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:22s} {1000 * base['min_s']:12.2f} {1000 * current['min_s']:12.2f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the extract / classify / map / render / redraw stages on synthetic data.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--shape", nargs=3, type=int, default=(70, 70, NWAVE), metavar=("NY", "NX", "NWAVE"),
+                        help="synthetic cube shape (default: 70 70 4563)")
+    parser.add_argument("--soundfont", default="FluidR3_GM.sf2")
+    parser.add_argument("-o", "--out", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = {"environment": environment(), "shape": list(args.shape),
+              "results": run_benchmarks(args.names or list(BENCHMARKS), args.repeat, tuple(args.shape), args.soundfont)}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from cube_cache import get_cube
+
+
+# Label value for spaxels the model could not classify (masked / empty spectra)
+UNCLASSIFIED = 255
+
+
+def label_cube_path(filename):
+    return f"{filename}.labels.npy"
+
+
+def cube_shape(filename):
+    """(ny, nx, nwave) of a LOGCUBE, read from the FLUX header without loading data."""
+    from astropy.io import fits
+    hdr = fits.getheader(filename, 'FLUX')
+    return hdr['NAXIS2'], hdr['NAXIS1'], hdr['NAXIS3']
+
+
+def load_label_cube(filename):
+    """Memory-map the label cube for filename, or None if it is missing or older than the FITS file."""
+    path = label_cube_path(filename)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(filename):
+            return None
+    except OSError:
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+# ===== Worker side =====
+_worker_cube = None
+
+def _init_worker(filename):
+    global _worker_cube
+    _worker_cube = get_cube(filename)
+
+
+def _classify_row(j):
+    nx = _worker_cube.flux.shape[2]
+    nwave = _worker_cube.flux.shape[0]
+    row = np.full((nx, nwave), UNCLASSIFIED, dtype=np.uint8)
+    failed = 0
+    for i in range(nx):
+        try:
+            spec = _worker_cube.get_spectrum(j, i)
+            spec.infer.components()
+            row[i] = spec.infer.pred_arr
+        except Exception:
+            failed += 1
+    return j, row, failed
+
+
+def classify_cube(filename, workers=None, out_path=None):
+    """Run the component inference for every spaxel and save a uint8 (ny, nx, nwave) label cube.
+
+    Labels are the raw pred_arr values, indexed like cube.get_spectrum(j, i) -> labels[j, i].
+    """
+    out_path = out_path or label_cube_path(filename)
+    ny, nx, nwave = cube_shape(filename)
+    workers = workers or os.cpu_count()
+
+    # Write into a temporary file so a half-finished run never looks valid
+    tmp_path = f"{out_path}.tmp-{os.getpid()}-{threading.get_ident()}.npy"
+    labels = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(ny, nx, nwave))
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(filename,)) as pool:
+        for done, (j, row, row_failed) in enumerate(pool.map(_classify_row, range(ny)), 1):
+            labels[j] = row
+            failed += row_failed
+            print(f"\r{filename}: {done}/{ny} rows", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    labels.flush()
+    del labels
+    os.replace(tmp_path, out_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Saved: {out_path} ({ny * nx} spaxels in {elapsed:.1f} s, {failed} unclassified)")
+    return out_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute component labels for every spaxel of MaNGA cubes.")
+    parser.add_argument("cubes", nargs="+", help="LOGCUBE FITS files")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    for cube_file in args.cubes:
+        classify_cube(cube_file, workers=args.workers)
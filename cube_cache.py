@@ -0,0 +1,116 @@
+import os
+import threading
+from concurrent.futures import Future
+from collections import OrderedDict
+import numpy as np
+
+
+# Default budget for resident cubes (a MaNGA LOGCUBE is ~0.5-1 GB once loaded)
+DEFAULT_MAX_BYTES = int(os.environ.get("COSMIC_CUBE_CACHE_BYTES", 2 * 1024**3))
+
+
+def load_manga_cube(filename):
+    import lime
+    return lime.Cube.from_file(filename, instrument='manga')
+
+
+def cube_nbytes(cube):
+    """Rough resident size of a loaded cube: the sum of its array attributes."""
+    total = 0
+    for value in vars(cube).values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+    return total
+
+
+class CubeCache:
+    """Keeps recently used cubes open, evicting least recently used ones past max_bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, loader=load_manga_cube):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (cube, nbytes)
+        self._bytes = 0
+        self._loading = {}  # key -> Future of a load in progress
+        self._lock = threading.Lock()
+
+    def _key(self, filename):
+        # Re-load when the file on disk changes
+        path = os.path.abspath(filename)
+        return path, os.stat(path).st_mtime_ns
+
+    def get(self, filename):
+        """The loaded cube, loading it first if needed.
+
+        Loading happens outside the lock, so a cold load never blocks other cubes' hits;
+        threads asking for a cube that is being loaded wait for that load.
+        """
+        key = self._key(filename)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            loading = self._loading.get(key)
+            if loading is None:
+                self.misses += 1
+                future = self._loading[key] = Future()
+            else:
+                self.hits += 1
+        if loading is not None:
+            return loading.result()
+
+        try:
+            cube = self.loader(filename)
+            nbytes = cube_nbytes(cube)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._entries[key] = (cube, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        future.set_result(cube)
+        return cube
+
+    def _evict(self):
+        # Always keep the newest cube, even if it alone is over budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "cubes": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared cache used by get_spaxel_spectra and the frontend
+cube_cache = CubeCache()
+
+
+def get_cube(filename):
+    return cube_cache.get(filename)
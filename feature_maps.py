@@ -0,0 +1,172 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+import numpy as np
+from spaxel_store import ROWS_PER_BLOCK
+from spectrum import COMPONENT_LUT, NO_COMPONENT, CONTINUUM, EMISSION, ABSORPTION, COSMIC_RAY
+
+
+# Per-spaxel summaries of the label cube, as float32 [x, y] maps (NaN for unclassified spaxels)
+FEATURES = {
+    'emission': "fraction of good samples labelled emission",
+    'absorption': "fraction of good samples labelled absorption",
+    'cosmic_rays': "number of samples labelled cosmic ray",
+    'line_wavelength': "rest wavelength (Angstroms) of the brightest emission sample",
+    'continuum': "median flux of the continuum samples",
+}
+FEATURES_VERSION = 1
+HEATMAP_ALPHA = 0.6
+
+
+def features_path(filename):
+    return f"{filename}.features.npz"
+
+
+def _masked_median(values, mask):
+    """Median of each row's masked values (NaN for none), in one sort instead of nanmedian's loop over rows."""
+    n = mask.sum(axis=1)
+    ordered = np.sort(np.where(mask, values, np.inf), axis=1)
+    rows = np.arange(len(values))
+    median = (ordered[rows, np.maximum(n - 1, 0) // 2] + ordered[rows, n // 2]) / 2
+    return np.where(n > 0, median, np.nan)
+
+
+def compute_features(filename):
+    """Every feature map of a cube, from its label cube and spectra in blocks of rows.
+
+    Good samples have ivar > 0, no DONOTUSE bit and a component label, like the
+    samples the co-adds weight (see regions.py).
+    """
+    from classify_cube import load_label_cube, UNCLASSIFIED
+    from regions import CubeArrays, _weights
+    label_cube = load_label_cube(filename)
+    if label_cube is None:
+        raise FileNotFoundError(f"no label cube for {filename} (run classify_cube.py first)")
+    n_x, n_y, nwave = label_cube.shape
+    maps = {name: np.full((n_x, n_y), np.nan, dtype=np.float32) for name in FEATURES}
+
+    with CubeArrays(filename) as cube:
+        for x0 in range(0, n_x, ROWS_PER_BLOCK):
+            x1 = min(x0 + ROWS_PER_BLOCK, n_x)
+            xs, ys = (a.ravel() for a in np.mgrid[x0:x1, :n_y])
+            flux, ivar, mask = cube.gather(xs, ys)
+            labels = np.asarray(label_cube[x0:x1]).reshape(-1, nwave)
+            classified = labels[:, 0] != UNCLASSIFIED
+            components = COMPONENT_LUT[labels]
+            good = (_weights(ivar, mask) > 0) & (components != NO_COMPONENT) & np.isfinite(flux)
+            n_good = good.sum(axis=1)
+            emission = good & (components == EMISSION)
+            continuum = good & (components == CONTINUUM)
+
+            brightest = np.argmax(np.where(emission, flux, -np.inf), axis=1)
+            block = {
+                'emission': emission.sum(axis=1) / np.maximum(n_good, 1),
+                'absorption': (good & (components == ABSORPTION)).sum(axis=1) / np.maximum(n_good, 1),
+                'cosmic_rays': (good & (components == COSMIC_RAY)).sum(axis=1),
+                'line_wavelength': np.where(emission.any(axis=1), cube.wave_rest[brightest], np.nan),
+                'continuum': _masked_median(flux, continuum),
+            }
+            keep = classified & (n_good > 0)
+            for name, values in block.items():
+                maps[name][xs[keep], ys[keep]] = values[keep]
+    return maps
+
+
+def build_features(filename):
+    """Compute and save <cube>.features.npz; returns its path."""
+    out_path = features_path(filename)
+    tmp_path = f"{out_path}.tmp-{os.getpid()}-{threading.get_ident()}.npz"
+    np.savez(tmp_path, version=FEATURES_VERSION, **compute_features(filename))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def load_features(filename):
+    """The feature maps of filename as {name: array}, or None if missing or older than the FITS file or label cube."""
+    from classify_cube import label_cube_path
+    path = features_path(filename)
+    try:
+        built = os.path.getmtime(path)
+        if built < os.path.getmtime(filename) or built < os.path.getmtime(label_cube_path(filename)):
+            return None
+        with np.load(path) as npz:
+            if int(npz['version']) != FEATURES_VERSION:
+                return None
+            return {name: npz[name] for name in FEATURES}
+    except (OSError, KeyError):
+        return None
+
+
+_building = {}  # absolute cube path -> Future of a build in progress
+_building_lock = threading.Lock()
+
+
+def get_features(filename):
+    """The cube's feature maps, computing them first if needed.
+
+    Threads asking for a cube whose maps are being built wait for that build instead
+    of starting their own.
+    """
+    features = load_features(filename)
+    if features is not None:
+        return features
+    key = os.path.abspath(filename)
+    with _building_lock:
+        building = _building.get(key)
+        if building is None:
+            future = _building[key] = Future()
+    if building is not None:
+        building.result()
+        return load_features(filename)
+
+    try:
+        build_features(filename)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(None)
+    finally:
+        with _building_lock:
+            del _building[key]
+    return load_features(filename)
+
+
+def heatmap(values, size, cmap='viridis', alpha=HEATMAP_ALPHA, pctl=99):
+    """A size x size RGBA overlay of an [x, y] map, with x across and y down like the frontend's
+    spaxel clicks. Values are scaled between the (100 - pctl) and pctl percentiles; NaN is transparent."""
+    from PIL import Image
+    from matplotlib import colormaps
+    values = np.asarray(values, dtype=np.float64).T
+    finite = np.isfinite(values)
+    low, high = np.percentile(values[finite], [100 - pctl, pctl]) if finite.any() else (0, 1)
+    scaled = np.clip((values - low) / ((high - low) or 1), 0, 1)
+    rgba = colormaps[cmap](np.where(finite, scaled, 0))
+    rgba[..., 3] = np.where(finite, alpha, 0)
+    image = Image.fromarray((rgba * 255).astype(np.uint8), "RGBA")
+    return image.resize(size if isinstance(size, tuple) else (size, size), Image.NEAREST)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-spaxel feature maps (heatmap overlays) for classified MaNGA cubes.")
+    parser.add_argument("paths", nargs="+", help="LOGCUBE FITS files or directories of them")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    cube_files = []
+    for path in args.paths:
+        cube_files += sorted(glob.glob(os.path.join(path, "*.fits"))) if os.path.isdir(path) else [path]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(build_features, f): f for f in cube_files}
+        for future in as_completed(futures):
+            try:
+                print(f"✅ Saved: {future.result()}")
+            except Exception as e:
+                print(f"{futures[future]} failed: {e}", file=sys.stderr)
+    print(f"{len(cube_files)} cubes in {time.perf_counter() - start:.1f} s")
@@ -1,15 +1,27 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
 from collections import deque
 import math
 from tkmacosx import Button
-from sonify import sonify_spectrum_to_wav
 #remove_trailing_silence_from_wav
-from spaxel_to_wav import get_spaxel_spectra
+# sonify, synth, spaxel_to_wav (lime) and spectrum_plot (matplotlib) are imported on
+# first use, or by warmup() once the window is up, so they don't delay the first window
+from render_cache import RenderCache
+from prefetch import Prefetcher
+import band_images
+import feature_maps
+from tracing import span, count, traced
 import os
 import sys
 import threading
+import queue
+import itertools
+import tempfile
+import shutil
+import atexit
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 #pip3 install PyObjC
 
 # ========== Setup main window ==========
@@ -19,13 +31,33 @@ root.geometry("1000x800")
 IMG_WIDTH = 500
 IMG_HEIGHT = 500
 root.configure(bg='black')
-image_paths = ["manga-7443-12703-LOGCUBE.fits.png", "manga-7443-12704-LOGCUBE.fits.png", "manga-8313-12701-LOGCUBE.fits.png", "manga-8979-9101-LOGCUBE.fits.png","manga-8979-12701-LOGCUBE.fits.png","manga-9872-6104-LOGCUBE.fits.png","manga-9872-9102-LOGCUBE.fits.png","manga-9872-12705-LOGCUBE.fits.png"] 
+# Every galaxy with a preview in COSMIC_GALAXY_DIR; cubes without one get it generated (band_images.py)
+# in the background, only the first run builds previews before the window opens
+galaxy_dir = os.environ.get("COSMIC_GALAXY_DIR", ".")
+image_paths = band_images.discover(galaxy_dir)
+if len(image_paths) < 3:
+    image_paths = band_images.discover(galaxy_dir, build=True)
+if not image_paths:
+    sys.exit(f"No galaxies in {os.path.abspath(galaxy_dir)}: add LOGCUBE FITS files or their .fits.png previews, "
+             "or point COSMIC_GALAXY_DIR at a directory that has them.")
+if len(image_paths) < 3:
+    image_paths = image_paths * 3  # the carousel shows three thumbnails, the current galaxy second
 image_paths = deque(image_paths) 
+current_band = "rgb"  # "rgb" for the preview image, else a band_images.BANDS name
 animation_running = False
 animation_step = 0
 animation_id = None
 animation_speed = 100 #important speed parameter!
+cursor_item = None  # canvas item of the sweep cursor
 selected_spaxel = None
+# "fluidsynth" (MIDI file + external fluidsynth) or "numpy" (in-memory synth, no binary needed)
+synth_backend = os.environ.get("COSMIC_SYNTH_BACKEND", "fluidsynth")
+# Optional fixed length for every spaxel's audio in seconds (COSMIC_TARGET_SECONDS, 0 = one note per sample)
+target_seconds = float(os.environ.get("COSMIC_TARGET_SECONDS", 0))
+
+def max_notes():
+    from sonify import notes_for_duration
+    return notes_for_duration(target_seconds) if target_seconds else None
 
 style = ttk.Style(root)
 style.configure('TButton',
@@ -70,19 +102,20 @@ carousel_frame.pack(side="top", fill="x", pady=(5, 0))
 carousel_inner = tk.Frame(carousel_frame, bg='black')
 carousel_inner.pack(anchor="center")
 
-# Create thumbnails
-thumbnails = []
-for path in image_paths:
-    thumb = Image.open(path).copy()
-    thumb.thumbnail((60, 60)) 
-    thumbnails.append(ImageTk.PhotoImage(thumb))
-thumbnails = deque(thumbnails)  # always keep current image at the second position
+# Thumbnails are made only for the galaxies shown, from the on-disk cache (band_images.load_thumbnail)
+thumbnails = {}  # preview path -> PhotoImage
+
+def thumbnail(path):
+    if path not in thumbnails:
+        thumbnails[path] = ImageTk.PhotoImage(band_images.load_thumbnail(path))
+    return thumbnails[path]
+
 left_btn = tk.Button(carousel_inner, text="<", width=2, borderwidth=0, highlightthickness=0, command=lambda: update_image(1))
 left_btn.pack(side="left", padx=10)
 
 three_thumbnails = []
-for i, thumb in enumerate(thumbnails):
-    thumbnail_label = tk.Label(carousel_inner, image=thumbnails[i], bg='white', bd=2, relief="ridge")
+for i, path in enumerate(image_paths):  # the current image is always at the second position
+    thumbnail_label = tk.Label(carousel_inner, image=thumbnail(path), bg='white', bd=2, relief="ridge")
     thumbnail_label.pack(side="left", padx=10)
     three_thumbnails.append(thumbnail_label)
     if i==2: break # only three thumbnails
@@ -90,92 +123,205 @@ for i, thumb in enumerate(thumbnails):
 right_btn = tk.Button(carousel_inner, text=">", width=2, bd=0, command=lambda: update_image(-1))
 right_btn.pack(side="left", padx=10)
 
+# Band shown for the current galaxy
+band_choice = ttk.Combobox(carousel_frame, values=["rgb", *band_images.BANDS], state="readonly", width=10)
+band_choice.set(current_band)
+band_choice.pack(side="top", pady=(5, 0))
+
+# Feature map drawn over the galaxy as a heatmap (feature_maps.py), or "none"
+feature_choice = ttk.Combobox(carousel_frame, values=["none", *feature_maps.FEATURES], state="readonly", width=14)
+feature_choice.set("none")
+feature_choice.pack(side="top", pady=(5, 0))
+
 # ===== Carousel functions =====
 def update_image(new_index):
-    global img, tk_img, three_thumbnails, image_paths, thumbnails
+    global img, tk_img, three_thumbnails, image_paths
     stop_animation()
+    cancel_jobs()
+    clear_overlay()  # the marker and cursor belong to the previous galaxy
     if new_index < 0:
-        thumbnails.rotate(-1)
         image_paths.rotate(-1)
     else:
-        thumbnails.rotate(1)
         image_paths.rotate(1)
     for i, thumb in enumerate(three_thumbnails):
-        thumb.config(image=thumbnails[i]) #update the thumbnail images
-    resize_image(imageCanvas)  # update the main image
+        thumb.config(image=thumbnail(image_paths[i])) #update the thumbnail images
+    request_band_image()  # update the main image
+    request_heatmap()
+
+def add_galaxies(paths):
+    # New previews from the background build join the end of the carousel
+    image_paths.extend(path for path in paths if path not in image_paths)
+
+# === Galaxy image: decoded and scaled once, overlays are canvas items ===
+base_images = {}  # (path, band) -> IMG_WIDTH x IMG_HEIGHT RGBA image
+tk_img = None
+shown_key = None  # (path, band, size) that tk_img was made for
+img_offset = (0, 0)
+img_size = (IMG_WIDTH, IMG_HEIGHT)
+
+def base_image(path, band="rgb"):
+    if (path, band) not in base_images:
+        if band == "rgb":
+            image = Image.open(path)
+        else:
+            # Two planes of the cube's cumulative flux index (built on first use)
+            image = band_images.band_preview(band_images.get_index(path[:-4]), band)
+        base_images[(path, band)] = image.convert("RGBA").resize((IMG_WIDTH, IMG_HEIGHT))
+    return base_images[(path, band)]
+
+def request_band_image():
+    """Show the current galaxy in current_band, computing the band image in the background if needed."""
+    path, band = image_paths[1], current_band
+    if band == "rgb" or (path, band) in base_images:
+        resize_image()
+        return
+    job_id = current_job
 
-img = Image.open(image_paths[1]).convert("RGBA")
-img = img.resize((IMG_WIDTH, IMG_HEIGHT))
+    def compute():
+        try:
+            base_image(path, band)
+            ui_queue.put((job_id, resize_image, ()))
+        except Exception as e:
+            ui_queue.put((job_id, print, (f"No {band} image for {path}: {e}",)))
+    pending_jobs.append(pipeline_executor.submit(compute))
+
+def select_band(event=None):
+    global current_band
+    current_band = band_choice.get()
+    cancel_jobs()
+    request_band_image()
+
+band_choice.bind("<<ComboboxSelected>>", select_band)
+
+# === Heatmap overlay: feature maps computed once per cube, drawn as a canvas item ===
+current_feature = "none"
+feature_sets = {}  # preview path -> {feature: [x, y] map}
+heatmaps = {}  # (path, feature) -> IMG_WIDTH x IMG_HEIGHT RGBA image
+heat_tk_img = None
+shown_heat_key = None  # (path, feature, size) that heat_tk_img was made for
+# Whole-cube feature builds get their own thread, so spaxel jobs never queue behind them
+feature_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="features")
+heatmap_requests = set()  # (path, feature) queued or being computed, touched on the Tk thread only
+
+def request_heatmap():
+    """Overlay current_feature on the current galaxy, loading or computing its feature maps in the background if needed."""
+    path, feature = image_paths[1], current_feature
+    if feature == "none" or (path, feature) in heatmaps:
+        resize_image()
+        return
+    if (path, feature) in heatmap_requests:
+        return
+    heatmap_requests.add((path, feature))
+
+    # Not a spaxel job: clicks and band changes must not cancel it. resize_image draws
+    # whatever galaxy and feature are current once it is done, so the redraw is never stale.
+    def compute():
+        try:
+            if path not in feature_sets:
+                feature_sets[path] = feature_maps.get_features(path[:-4])
+            heatmaps[(path, feature)] = feature_maps.heatmap(feature_sets[path][feature], (IMG_WIDTH, IMG_HEIGHT))
+            ui_queue.put((None, resize_image, ()))
+        except Exception as e:
+            ui_queue.put((None, print, (f"No {feature} map for {path}: {e}",)))
+        finally:
+            ui_queue.put((None, heatmap_requests.discard, ((path, feature),)))
+    feature_executor.submit(compute)
+
+def select_feature(event=None):
+    global current_feature
+    current_feature = feature_choice.get()
+    request_heatmap()
+
+feature_choice.bind("<<ComboboxSelected>>", select_feature)
+
+img = base_image(image_paths[1])
 # === Resize and center image on canvas ===
 def resize_image(event=None):
-    global tk_img, img_offset, img_size, img
-    img = Image.open(image_paths[1])
-    img = img.resize((IMG_WIDTH, IMG_HEIGHT))
-    if isinstance(event, tk.Event):  # Called from canvas resizing
-        canvas = event.widget
-    else:
-        canvas = imageCanvas  # Manual call
+    global tk_img, img_offset, img_size, img, shown_key, heat_tk_img, shown_heat_key
+    # The band image while it is still being computed: the preview
+    band = current_band if (image_paths[1], current_band) in base_images else "rgb"
+    img = base_image(image_paths[1], band)
+    canvas = imageCanvas
 
     canvas_width = canvas.winfo_width()
     canvas_height = canvas.winfo_height()
 
-    img_copy = img.copy()
-    img_copy.thumbnail((canvas_width, canvas_height))
-    tk_img = ImageTk.PhotoImage(img_copy)
+    # Shrink to fit the canvas (never enlarge), keeping the aspect ratio
+    scale = min(1.0, canvas_width / IMG_WIDTH, canvas_height / IMG_HEIGHT)
+    size = (max(1, int(IMG_WIDTH * scale)), max(1, int(IMG_HEIGHT * scale)))
+    # Only build a new PhotoImage when the picture or its size actually changed
+    if shown_key != (image_paths[1], band, size):
+        tk_img = ImageTk.PhotoImage(img if size == img.size else img.resize(size))
+        shown_key = (image_paths[1], band, size)
 
-    img_width, img_height = img_copy.size
+    img_width, img_height = size
     x_offset = (canvas_width - img_width) // 2
     y_offset = (canvas_height - img_height) // 2
 
+    # Keep the click marker and sweep cursor where they were on the image
+    if (x_offset, y_offset) != img_offset or size != img_size:
+        canvas.scale("overlay", *img_offset, img_width / img_size[0], img_height / img_size[1])
+        canvas.move("overlay", x_offset - img_offset[0], y_offset - img_offset[1])
     img_offset = (x_offset, y_offset)
     img_size = (img_width, img_height)
 
-    canvas.delete("all")
-    canvas.create_image(x_offset, y_offset, image=tk_img, anchor="nw")
+    # Only the images are replaced; "overlay" items stay on top of them
+    canvas.delete("base", "heatmap")
+    canvas.create_image(x_offset, y_offset, image=tk_img, anchor="nw", tags="base")
+    canvas.tag_lower("base")
     canvas.image = tk_img
+    heat_key = (image_paths[1], current_feature)
+    if heat_key in heatmaps:
+        if shown_heat_key != (*heat_key, size):
+            heat = heatmaps[heat_key]
+            heat_tk_img = ImageTk.PhotoImage(heat if size == heat.size else heat.resize(size, Image.NEAREST))
+            shown_heat_key = (*heat_key, size)
+        canvas.create_image(x_offset, y_offset, image=heat_tk_img, anchor="nw", tags="heatmap")
+        canvas.tag_raise("heatmap", "base")
+
+def clear_overlay():
+    imageCanvas.delete("overlay")
+
+def feature_text(x, y):
+    """The shown feature's value at a spaxel, for the coordinate label."""
+    maps = feature_sets.get(image_paths[1])
+    if current_feature == "none" or maps is None:
+        return ""
+    values = maps[current_feature]
+    if not (0 <= x < values.shape[0] and 0 <= y < values.shape[1]):
+        return ""
+    return f"  {current_feature}: {values[x, y]:.3g}"
 
 #get image coordinates on click
 def on_canvas_click(event):
     global img, imageCanvas, play_type, animation_step, coord_label, selected_spaxel, image_paths
     animation_step = 0
     stop_animation()
+    cancel_jobs()
+    clear_overlay()
 
-    canvas_width = imageCanvas.winfo_width()
-    canvas_height = imageCanvas.winfo_height()
-
-    # Ensure the image is resized before proceeding
-    resize_image()
-
-    img_width, img_height = img.size
-    x_offset = (canvas_width - img_width) // 2
-    y_offset = (canvas_height - img_height) // 2
+    x_offset, y_offset = img_offset
+    img_width, img_height = img_size
 
     x_click, y_click = event.x, event.y
     if x_offset <= x_click <= x_offset + img_width and y_offset <= y_click <= y_offset + img_height:
         x_img = x_click - x_offset
         y_img = y_click - y_offset
-        # Draw on the image
-        draw = ImageDraw.Draw(img)
-        draw.ellipse(
-            [(x_img - 5, y_img - 5), (x_img + 5, y_img + 5)],
-            outline="white",fill="white", width=6
-        )
+        # Mark the click with a canvas item instead of redrawing the image
+        imageCanvas.create_oval(x_click - 5, y_click - 5, x_click + 5, y_click + 5,
+                                outline="white", fill="white", width=2, tags="overlay")
         # Update coord label
-        grid_x = int((x_img / 500) * 70)
-        grid_y = int((y_img / 500) * 70)
+        grid_x = int((x_img / img_width) * 70)
+        grid_y = int((y_img / img_height) * 70)
         selected_spaxel = (grid_x, grid_y)
-        coord_label.config(text=f"Selected Spaxel: ({grid_x}, {grid_y})")
+        coord_label.config(text=f"Selected Spaxel: ({grid_x}, {grid_y})" + feature_text(grid_x, grid_y))
+        if prefetch_size:
+            prefetcher.schedule(image_paths[1][:-4], grid_x, grid_y)
         # remove_trailing_silence_from_wav("sound.wav")
         
     else:
         coord_label.config(text="Click was outside the image.")
 
-    # Display updated image on canvas
-    tk_img = ImageTk.PhotoImage(img)
-    imageCanvas.delete("all")
-    imageCanvas.create_image(x_offset, y_offset, image=tk_img, anchor="nw")
-    imageCanvas.image = tk_img  # Keep a reference!
-
 # === Bind events ===
 imageCanvas.bind("<Configure>", resize_image)
 imageCanvas.bind("<Button-1>", on_canvas_click)
@@ -212,129 +358,96 @@ right_top.grid_columnconfigure(1, weight=1)
 
 
 # ========== Animation Functions ==========
-def draw_cursor(type, event=None):
-    global img, imageCanvas, play_type, animation_step
-    resize_image()  # Ensure the image is resized before drawing
+def cursor_shape(type, step):
+    """Canvas item kind and coordinates of the sweep cursor at an animation step, or None when done.
+
+    Positions are computed on the IMG_WIDTH x IMG_HEIGHT image and scaled to the displayed size.
+    """
+    width, height = IMG_WIDTH, IMG_HEIGHT
+    center_x, center_y = width // 2, height // 2
+    if type == 0:  # Moving horizontal line
+        y_position = step * 5  # Move down
+        if y_position > height:
+            return None
+        kind, coords = "line", (0, y_position, width, y_position)
+    elif type == 1:  # Moving vertical line
+        x_position = step * 5  # Move right
+        if x_position > width:
+            return None
+        kind, coords = "line", (x_position, 0, x_position, height)
+    elif type == 2:  # Rotating clock hand
+        angle = step * 10  # Rotate 10 degrees per frame
+        if angle > 360:
+            return None
+        end_x = int(center_x + (width // 2 - 10) * math.cos(math.radians(angle)))
+        end_y = int(center_y + (height // 2 - 10) * math.sin(math.radians(angle)))
+        kind, coords = "line", (center_x, center_y, end_x, end_y)
+    else:  # Pulsating point
+        # Grow from a single point in the center until the circle covers the image
+        radius = max(step * 10, 2)
+        if radius > width // 2:
+            return None
+        kind, coords = "oval", (center_x - radius, center_y - radius, center_x + radius, center_y + radius)
+
+    scale = img_size[0] / IMG_WIDTH
+    x_offset, y_offset = img_offset
+    return kind, [c * scale + (x_offset if k % 2 == 0 else y_offset) for k, c in enumerate(coords)]
+
+def cursor_frames(type):
+    return next(step for step in itertools.count() if cursor_shape(type, step) is None)
+
+def draw_cursor(type, event=None, cancel=True):
+    global play_type, animation_step, cursor_item
     animation_step = 0
     stop_animation()
-    # Get the image dimensions
-    width, height = img.size
-    draw = ImageDraw.Draw(img)
+    if cancel:
+        cancel_jobs()  # silences a sweep that is still playing
+    clear_overlay()
     play_type = type
-    if type == 0:  # Horizontal line
-        line_start = (0, 0)
-        line_end = (width, 0)
-        draw.line([line_start, line_end], fill=(255, 255, 255, 255), width=3)
-    elif type == 1:  # Vertical line
-        line_start = (0, 0)
-        line_end = (0, height)
-        draw.line([line_start, line_end], fill=(255, 255, 255, 255), width=3)
-    elif type == 2: #clock line
-        line_start = (width//2, height//2)
-        line_end = (width, height//2)
-        draw.line([line_start, line_end], fill=(255, 255, 255, 255), width=3)
-    elif type == 3: #single point in center
-        center_x = width // 2
-        center_y = height // 2
-        radius = 2
-        x1 = center_x - radius
-        y1 = center_y - radius
-        x2 = center_x + radius
-        y2 = center_y + radius
-        draw.ellipse([(x1, y1), (x2, y2)], outline="white", width=3)
-    # Convert the modified PIL image to Tkinter PhotoImage
-    tk_img = ImageTk.PhotoImage(img)
-    # Update the image on the canvas
-    imageCanvas.delete("all")
-    canvas_width = imageCanvas.winfo_width()
-    canvas_height = imageCanvas.winfo_height()
-    img_width, img_height = img.size
-    x_offset = (canvas_width - img_width) // 2
-    y_offset = (canvas_height - img_height) // 2
-    imageCanvas.create_image(x_offset, y_offset, image=tk_img, anchor="nw")
-    imageCanvas.image = tk_img  # Keep a reference!
-
-def update_canvas():
-    global img, imageCanvas, tk_img
-    try:
-        tk_img = ImageTk.PhotoImage(img)
-        imageCanvas.delete("all")
-        canvas_width = imageCanvas.winfo_width()
-        canvas_height = imageCanvas.winfo_height()
-        img_width, img_height = img.size
-        x_offset = (canvas_width - img_width) // 2
-        y_offset = (canvas_height - img_height) // 2
-        imageCanvas.create_image(x_offset, y_offset, image=tk_img, anchor="nw")
-        imageCanvas.image = tk_img
-    except Exception as e:
-        print(f"Error updating canvas: {e}")
+    kind, coords = cursor_shape(type, 0)
+    if kind == "line":
+        cursor_item = imageCanvas.create_line(*coords, fill="white", width=3, tags="overlay")
+    else:
+        cursor_item = imageCanvas.create_oval(*coords, outline="white", width=3, tags="overlay")
 
 def play_animation(event=None):
-    global play_type, animation_running, animation_step, animation_id, img
     if play_type is None or animation_running:
         return
+    cube_file = image_paths[1][:-4]
+    if not os.path.exists(cube_file):
+        start_cursor(animation_speed)  # only the preview image: a silent sweep
+        return
+    # Sonified sweep (sweep.py): the cursor starts with the audio and keeps pace with it
+    cancel_jobs()
+    future = pipeline_executor.submit(run_sweep_job, current_job, cube_file, play_type, get_sweep_pool())
+    pending_jobs.append(future)
 
+def start_sweep(seconds, player, *args):
+    start_audio(player, *args)
+    start_cursor(1000 * seconds / max(cursor_frames(play_type) - 1, 1))
+
+def start_cursor(frame_ms):
+    global animation_running, animation_step, animation_id
+
+    # Start from a clean cursor; every frame only moves it
+    draw_cursor(play_type, cancel=False)
     animation_running = True
     animation_step = 0
 
     def animate_frame():
-        global animation_step, animation_id, animation_running, img, image_paths
+        global animation_step, animation_id, animation_running
         if not animation_running:
             return
 
         try:
-            # Open the original image for each frame
-            img = Image.open(image_paths[1]).convert("RGBA")
-            img = img.resize((IMG_WIDTH, IMG_HEIGHT))
-            width, height = img.size
-            draw = ImageDraw.Draw(img)
-
-            if play_type == 0:  # Moving horizontal line
-                y_position = (animation_step * 5)  # Move down 
-                if y_position > height: 
-                    stop_animation()
-                    return
-                draw.line([(0, y_position), (width, y_position)], fill="white", width=3)
-            elif play_type == 1:  # Moving vertical line
-                x_position = (animation_step * 5) # Move right 
-                if x_position > width:
-                    stop_animation()
-                    return
-                draw.line([(x_position, 0), (x_position, height)], fill="white", width=3)
-            elif play_type == 2:  # Rotating clock hand
-                center_x, center_y = width // 2, height // 2
-                angle = (animation_step * 10) # Rotate 10 degrees per frame
-                if angle >360:
-                    stop_animation()
-                    return
-                end_x = int(center_x + (width // 2 - 10) * math.cos(math.radians(angle)))
-                end_y = int(center_y + (height // 2 - 10) * math.sin(math.radians(angle)))
-                draw.line([(center_x, center_y), (end_x, end_y)], fill="white", width=3)
-            elif play_type == 3:  # Pulsating point
-                center_x, center_y = width // 2, height // 2
-                max_radius = width // 2  # Maximum possible radius to cover the image
-                # Make the radius grow and reset
-                radius = (animation_step * 10) % (max_radius * 2)
-                if radius > max_radius:
-                    stop_animation()
-                else:
-                    current_radius = radius
-
-                # You might want to control the visibility with alpha (transparency)
-                alpha = int(255 * (1 - current_radius / max_radius))
-
-                # Draw the expanding/shrinking circle
-                draw.ellipse([(center_x - current_radius, center_y - current_radius),
-                              (center_x + current_radius, center_y + current_radius)],
-                             outline="white")
-
-            update_canvas()
+            shape = cursor_shape(play_type, animation_step)
+            if shape is None:
+                stop_animation()
+                return
+            imageCanvas.coords(cursor_item, *shape[1])
             animation_step += 1
-            animation_id = root.after(animation_speed, animate_frame)
+            animation_id = root.after(int(frame_ms), animate_frame)
 
-        except FileNotFoundError:
-            print(f"Error: Image not found during animation.")
-            stop_animation()
         except Exception as e:
             print(f"Error during animation frame: {e}")
             stop_animation()
@@ -402,39 +515,246 @@ def set_animation_speed(value):
     animation_speed = value
     print(f"Animation speed set to: {animation_speed}")
 
+# ========== Background spaxel pipeline ==========
+# load -> classify -> plot -> render runs on worker threads; results come back to the
+# Tk thread through ui_queue, which poll_ui_queue drains with root.after.
+pipeline_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="spaxel")
+ui_queue = queue.Queue()
+job_ids = itertools.count(1)
+current_job = 0
+pending_jobs = []
+audio_process = None
+spectrum_size = (400, 300)  # last known size of the spectrum canvas, read on the Tk thread
+work_dir = tempfile.mkdtemp(prefix="cosmic-composers-")
+render_cache = RenderCache()  # rendered audio + plots, keyed by cube, spaxel and mapping
+# Optional speculative rendering of the N x N spaxels around each selection (COSMIC_PREFETCH=N, 0 = off)
+prefetch_size = int(os.environ.get("COSMIC_PREFETCH", 0))
+atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
+# Processes rendering sweep steps (COSMIC_SWEEP_WORKERS, default all cores); step length is COSMIC_SWEEP_STEP_SECONDS
+sweep_workers = int(os.environ.get("COSMIC_SWEEP_WORKERS", 0)) or None
+sweep_pool = None  # sweep.StepPool, started by the first sweep
+
+class JobCancelled(Exception):
+    pass
+
+def check_job(job_id):
+    if job_id != current_job:
+        raise JobCancelled()
+
+def cancel_jobs():
+    """Make every queued or running job stale and stop its playback."""
+    global current_job
+    current_job = next(job_ids)
+    for future in pending_jobs:
+        future.cancel()
+    pending_jobs.clear()
+    spaxel_spectrum.config(text="Spaxel Spectrum")
+    if audio_process is not None and audio_process.poll() is None:
+        audio_process.terminate()
+
+def spaxel_keys(filename, x, y):
+    from sonify import mapping_params
+    plot_key = render_cache.spaxel_key(filename, x, y, kind="plot")
+    audio_key = render_cache.spaxel_key(filename, x, y, kind="audio", backend=synth_backend, mapping=mapping_params(max_notes()))
+    return plot_key, audio_key
+
+def render_plot(spectrum, x, y, size):
+    # In memory at the canvas size, no file I/O
+    from spectrum_plot import get_plotter
+    with span("frontend.render_plot"):
+        return get_plotter().render_rgba(spectrum, x, y, *size)
+
+def cache_plot(rgba, plot_key):
+    # Written after the plot is on screen, so repeat visits can skip plotting
+    with span("frontend.cache_plot"):
+        tmp_path = render_cache.tmp_path("png")
+        Image.fromarray(rgba).save(tmp_path, format="PNG")
+        return render_cache.commit(tmp_path, plot_key, "png")
+
+def render_audio(spectrum, audio_key):
+    from sonify import sonify_spectrum_to_wav
+    tmp_path = render_cache.tmp_path("wav")
+    midi_path = os.path.join(work_dir, f"spectrum_{threading.get_ident()}.mid")
+    with span("frontend.render_audio", backend=synth_backend):
+        sonify_spectrum_to_wav(spectrum, midi_path=midi_path, wav_path=tmp_path, backend=synth_backend, max_notes=max_notes())
+        return render_cache.commit(tmp_path, audio_key, "wav")
+
+def prefetch_spaxel(filename, x, y, checkpoint):
+    # Same results as run_spaxel_job, straight into the render cache
+    from spaxel_to_wav import get_spaxel_spectrum
+    plot_key, audio_key = spaxel_keys(filename, x, y)
+    have_plot = os.path.exists(render_cache.path(plot_key, "png"))
+    have_audio = os.path.exists(render_cache.path(audio_key, "wav"))
+    if have_plot and have_audio:
+        return
+    spectrum = get_spaxel_spectrum(filename, x, y)
+    checkpoint()
+    if not have_plot:
+        cache_plot(render_plot(spectrum, x, y, spectrum_size), plot_key)
+        checkpoint()
+    if not have_audio:
+        render_audio(spectrum, audio_key)
+
+def run_spaxel_job(job_id, filename, x, y, size):
+    # Runs on a pipeline thread: never touch widgets here, post to ui_queue instead
+    from spaxel_to_wav import get_spaxel_spectrum
+    from sonify import stream_spectrum
+    import synth, postprocess
+    try:
+        check_job(job_id)
+        with prefetcher.foreground(), span("frontend.spaxel_job", x=x, y=y):
+            with span("frontend.cache_lookup"):
+                plot_key, audio_key = spaxel_keys(filename, x, y)
+                plot_path = render_cache.get(plot_key, "png")
+                wav_path = render_cache.get(audio_key, "wav")
+            count("render_cache_hits", (plot_path is not None) + (wav_path is not None))
+
+            if plot_path is None or wav_path is None:
+                spectrum = get_spaxel_spectrum(filename, x, y)
+
+            if plot_path is None:
+                check_job(job_id)
+                rgba = render_plot(spectrum, x, y, size)
+                ui_queue.put((job_id, show_spectrum_plot, (rgba,)))
+                cache_plot(rgba, plot_key)
+            else:
+                ui_queue.put((job_id, show_spectrum_plot, (plot_path,)))
+
+            check_job(job_id)
+            if wav_path is not None:
+                ui_queue.put((job_id, start_audio, (play_sound, wav_path)))
+            elif synth_backend == "numpy" and stream_player_available():
+                # Start playing as soon as the first chunk is rendered; the cache fills as it plays,
+                # peak-normalized at the end like render_audio's entries under the same key
+                chunks = stream_spectrum(spectrum, max_notes=max_notes())
+                chunks = render_cache.tee_wav(chunks, audio_key, synth.SAMPLE_RATE, finish=postprocess.process_wav)
+                ui_queue.put((job_id, start_audio, (play_stream, chunks, job_id)))
+            else:
+                wav_path = render_audio(spectrum, audio_key)
+                ui_queue.put((job_id, start_audio, (play_sound, wav_path)))
+    except JobCancelled:
+        pass
+    except Exception as e:
+        ui_queue.put((job_id, print, (f"Error rendering spaxel ({x}, {y}): {e}",)))
+
+def run_sweep_job(job_id, filename, mode, pool):
+    # Steps are rendered on the sweep pool ahead of playback and mixed into one stream
+    import sweep
+    try:
+        check_job(job_id)
+        with span("frontend.sweep_job", mode=mode):
+            steps = sweep.sweep_steps(filename, mode)
+            if stream_player_available():
+                chunks = sweep.stream_sweep(filename, steps, executor=pool)
+                chunks = itertools.chain([next(chunks)], chunks)  # first step ready before the cursor starts
+                ui_queue.put((job_id, start_sweep, (len(steps) * sweep.STEP_SECONDS, play_stream, chunks, job_id)))
+            else:
+                wav_path = os.path.join(work_dir, f"sweep_{job_id}.wav")
+                sweep.render_sweep(filename, steps, wav_path, executor=pool)
+                check_job(job_id)
+                ui_queue.put((job_id, start_sweep, (len(steps) * sweep.STEP_SECONDS, play_sound, wav_path)))
+    except JobCancelled:
+        pass
+    except Exception as e:
+        ui_queue.put((job_id, print, (f"Error rendering the sweep: {e}",)))
+
+def get_sweep_pool():
+    # Worker processes that never import this module (see sweep.StepPool)
+    global sweep_pool
+    if sweep_pool is None:
+        import sweep
+        sweep_pool = sweep.StepPool(sweep_workers)
+        atexit.register(sweep_pool.shutdown, wait=False, cancel_futures=True)
+    return sweep_pool
+
+def poll_ui_queue():
+    while True:
+        try:
+            job_id, callback, args = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        if job_id is None or job_id == current_job:  # drop results of stale jobs
+            callback(*args)
+    root.after(50, poll_ui_queue)
+
+@traced("frontend.play_wav")
 def play_wav(event=None):
-    global selected_spaxel, spaxel_sound, image_canvas
+    global selected_spaxel, spectrum_size
     if selected_spaxel is None:
         print("No spaxel selected!")
         return
-    
-    filename = image_paths[1][:-4]
 
-    # will be a spectrum.png file in the same directory as the script
-    rest_wav, flux, continuum, emission, absorption, cosmic_rays = get_spaxel_spectra(filename, selected_spaxel[0], selected_spaxel[1])
-    
-    # spectrum_graph = ImageTk.PhotoImage(file="spectrum.png")
-    spectrum_graph = Image.open("spectrum.png").convert("RGBA")
-    # Get canvas dimensions
-    canvas_width = image_canvas.winfo_width()
-    canvas_height = image_canvas.winfo_height()
-
-    # Resize spectrum graph to fit canvas while maintaining aspect ratio
-    spectrum_graph.thumbnail((canvas_width, canvas_height))
+    cancel_jobs()
+    filename = image_paths[1][:-4]
+    prefetcher.record_request(filename, selected_spaxel[0], selected_spaxel[1])
+    spaxel_spectrum.config(text=f"Spaxel Spectrum: loading ({selected_spaxel[0]}, {selected_spaxel[1]})...")
+    spectrum_size = (image_canvas.winfo_width(), image_canvas.winfo_height())
+    future = pipeline_executor.submit(run_spaxel_job, current_job, filename, selected_spaxel[0], selected_spaxel[1], spectrum_size)
+    pending_jobs.append(future)
+
+@traced("frontend.show_plot")
+def show_spectrum_plot(plot):
+    """Show a plot given as an RGBA array (fresh render) or a cached PNG path."""
+    global image_canvas
+    if isinstance(plot, str):
+        spectrum_graph = Image.open(plot).convert("RGBA")
+        # Resize cached graph to fit canvas while maintaining aspect ratio
+        spectrum_graph.thumbnail((image_canvas.winfo_width(), image_canvas.winfo_height()))
+    else:
+        spectrum_graph = Image.fromarray(plot)  # already rendered at the canvas size
     # Create PhotoImage AND store a reference to it on the canvas itself
     image_canvas.spectrum_tk_img = ImageTk.PhotoImage(spectrum_graph)
+    image_canvas.delete("all")
     image_canvas.create_image(0, 0, image=image_canvas.spectrum_tk_img, anchor="nw")
     image_canvas.image = image_canvas.spectrum_tk_img
+    spaxel_spectrum.config(text="Spaxel Spectrum")
 
-
-    sonify_spectrum_to_wav(rest_wav, continuum, emission, absorption, cosmic_rays, wav_path="sound.wav")
-
-    audio_thread = threading.Thread(target=play_sound)
+def start_audio(player, *args):
+    audio_thread = threading.Thread(target=player, args=args)
     audio_thread.daemon = True # Allows the program to exit even if thread is running
     audio_thread.start() # Start the thread (doesn't block)
     print("Audio playback started in background.")
 
-def play_sound():
-    os.system("afplay sound.wav")
+def play_sound(wav_path="sound.wav"):
+    global audio_process
+    audio_process = subprocess.Popen(["afplay", wav_path])
+    audio_process.wait()
 
+def stream_player_available():
+    try:
+        import sounddevice
+        return True
+    except (ImportError, OSError):
+        return False
+
+def play_stream(chunks, job_id=None):
+    # Chunks are rendered lazily; stream.write blocks, so rendering stays just ahead of playback
+    import sounddevice as sd
+    import synth
+    with sd.OutputStream(samplerate=synth.SAMPLE_RATE, channels=1, dtype="float32") as stream:
+        for chunk in chunks:
+            if job_id is not None and job_id != current_job:
+                break  # a newer spaxel was selected
+            stream.write(chunk)
+            count("samples_played", len(chunk))
+
+prefetcher = Prefetcher(prefetch_spaxel, size=max(prefetch_size, 1))
+atexit.register(lambda: print(f"Prefetch stats: {prefetcher.stats()}") if prefetch_size else None)
+
+def warmup():
+    """Import the pipeline and build missing previews on a background thread, once the window is up."""
+    def run():
+        with span("frontend.warmup"):
+            import spaxel_to_wav, sonify
+            from spectrum_plot import get_plotter
+            get_plotter()
+            try:
+                import lime
+            except ImportError:
+                pass  # reported when a cube is first loaded
+            ui_queue.put((None, add_galaxies, (band_images.discover(galaxy_dir, build=True),)))
+    threading.Thread(target=run, daemon=True, name="warmup").start()
+
+root.after(50, poll_ui_queue)
+root.after(200, warmup)
 root.mainloop()
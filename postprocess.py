@@ -0,0 +1,153 @@
+import os
+import wave
+import numpy as np
+import synth
+
+
+SILENCE_DB = -40.0  # RMS level below which a window counts as silence
+WINDOW_SECONDS = 0.010  # RMS envelope resolution
+PEAK_DB = -1.0  # peak level after normalization
+FADE_SECONDS = 0.005  # fade applied where trailing audio is cut
+SCAN_WINDOWS = 256  # windows examined per step when looking for the sound's start or end
+
+_PCM_DTYPES = {1: np.uint8, 2: '<i2', 4: '<i4'}
+
+
+def db(value):
+    return 20 * np.log10(np.maximum(value, 1e-10))
+
+
+def read_wav(path):
+    """(samples, sample_rate) of a PCM WAV file: float32 in [-1, 1], (n,) for mono or (n, channels)."""
+    with wave.open(path, 'rb') as wf:
+        width, channels, sample_rate = wf.getsampwidth(), wf.getnchannels(), wf.getframerate()
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=_PCM_DTYPES[width])
+    if width == 1:  # 8-bit WAV is unsigned
+        samples = (pcm.astype(np.float32) - 128) / 128
+    else:
+        samples = pcm.astype(np.float32) / (2 ** (8 * width - 1))
+    return (samples if channels == 1 else samples.reshape(-1, channels)), sample_rate
+
+
+def rms_envelope(samples, window):
+    """RMS level in dBFS of each window of samples (channels averaged); a final partial window counts too."""
+    power = np.square(samples, dtype=np.float64)
+    if power.ndim > 1:
+        power = power.mean(axis=1)
+    n_windows = -(-len(power) // window)
+    sums = np.add.reduceat(power, np.arange(n_windows) * window) if len(power) else np.zeros(0)
+    sizes = np.minimum(window, len(power) - np.arange(n_windows) * window)
+    return db(np.sqrt(sums / sizes))
+
+
+def _sound_bounds(samples, window, threshold_db):
+    """(start, end) sample of the first and last loud window, scanning in from both ends; None if all silent.
+
+    Only the silent stretches and one block of sound are examined at each end, not the whole buffer.
+    """
+    n = len(samples)
+    n_windows = -(-n // window)
+    block = SCAN_WINDOWS
+    start = None
+    for w0 in range(0, n_windows, block):
+        loud = np.flatnonzero(rms_envelope(samples[w0 * window:(w0 + block) * window], window) > threshold_db)
+        if len(loud):
+            start = (w0 + loud[0]) * window
+            break
+    if start is None:
+        return None
+    # Windows counted from the end stay aligned with the forward scan
+    for w1 in range(n_windows, 0, -block):
+        w0 = max(w1 - block, 0)
+        loud = np.flatnonzero(rms_envelope(samples[w0 * window:w1 * window], window) > threshold_db)
+        if len(loud):
+            return start, min((w0 + loud[-1] + 1) * window, n)
+
+
+def trim_silence(samples, sample_rate=synth.SAMPLE_RATE, threshold_db=SILENCE_DB, window_seconds=WINDOW_SECONDS,
+                 leading=True, trailing=True):
+    """samples without the windows of silence at the start and/or end; all-silent input becomes empty."""
+    window = max(1, int(window_seconds * sample_rate))
+    bounds = _sound_bounds(samples, window, threshold_db)
+    if bounds is None:
+        return samples[:0]
+    start = bounds[0] if leading else 0
+    end = bounds[1] if trailing else len(samples)
+    trimmed = samples[start:end]
+    if end < len(samples):
+        trimmed = fade_out(trimmed, int(FADE_SECONDS * sample_rate))
+    return trimmed
+
+
+def fade_out(samples, n):
+    n = min(n, len(samples))
+    if n == 0:
+        return samples
+    ramp = np.linspace(1, 0, n, dtype=np.float32)
+    samples = samples.copy()
+    samples[-n:] *= ramp if samples.ndim == 1 else ramp[:, None]
+    return samples
+
+
+def normalize(samples, peak_db=PEAK_DB, rms_db=None):
+    """Scale samples to a peak level, or to an RMS loudness if given (never past the peak level)."""
+    peak = max(samples.max(), -samples.min()) if len(samples) else 0
+    if peak == 0:
+        return samples
+    gain = 10 ** (peak_db / 20) / peak
+    if rms_db is not None:
+        rms = np.sqrt(np.dot(samples.ravel(), samples.ravel()) / samples.size)
+        gain = min(gain, 10 ** (rms_db / 20) / rms)
+    samples = samples.astype(np.float32)  # a copy, so the caller's buffer is untouched
+    samples *= np.float32(gain)
+    return samples
+
+
+def process(samples, sample_rate=synth.SAMPLE_RATE, threshold_db=SILENCE_DB, peak_db=PEAK_DB, rms_db=None):
+    """Trim leading and trailing silence, then normalize. The in-memory post-processing stage."""
+    return normalize(trim_silence(samples, sample_rate, threshold_db), peak_db, rms_db)
+
+
+def process_wav(path, threshold_db=SILENCE_DB, peak_db=PEAK_DB, rms_db=None, leading=True, window_seconds=WINDOW_SECONDS):
+    """process() a WAV file in place (peak_db=None to only trim); the new file replaces the old one atomically."""
+    samples, sample_rate = read_wav(path)
+    samples = trim_silence(samples, sample_rate, threshold_db, window_seconds, leading=leading)
+    if peak_db is not None:
+        samples = normalize(samples, peak_db, rms_db)
+    tmp_path = f"{path}.tmp-{os.getpid()}.wav"
+    synth.write_wav(tmp_path, samples, sample_rate)
+    os.replace(tmp_path, path)
+    return len(samples)
+
+
+def trim_stream(chunks, sample_rate=synth.SAMPLE_RATE, threshold_db=SILENCE_DB, window_seconds=WINDOW_SECONDS, gain=1.0):
+    """trim_silence() for a stream of chunks: leading silence is dropped and silent stretches
+    are held back until more sound follows, so a trailing one is never yielded.
+
+    Levels are unknown up front, so instead of normalizing a fixed gain can be applied.
+    """
+    window = max(1, int(window_seconds * sample_rate))
+    carry = None  # samples short of a full window
+    held = []  # silence after the last loud window, yielded only if sound follows
+    started = False
+    for chunk in chunks:
+        buf = chunk if carry is None else np.concatenate([carry, chunk])
+        n_full = len(buf) // window * window
+        buf, carry = buf[:n_full], buf[n_full:]
+        if n_full == 0:
+            continue
+        loud = np.flatnonzero(rms_envelope(buf, window) > threshold_db)
+        if not started:
+            if len(loud) == 0:
+                continue
+            buf, loud, started = buf[loud[0] * window:], loud - loud[0], True
+        if len(loud) == 0:
+            held.append(buf)
+            continue
+        end = (loud[-1] + 1) * window
+        out = np.concatenate([*held, buf[:end]])
+        held = [buf[end:]]
+        yield out * gain if gain != 1.0 else out
+    if started and carry is not None and len(carry) and rms_envelope(carry, len(carry))[0] > threshold_db:
+        out = np.concatenate([*held, carry])
+        yield out * gain if gain != 1.0 else out
@@ -0,0 +1,135 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+class Prefetcher:
+    """Speculatively renders the neighbours of the last selection in the background.
+
+    compute(filename, x, y, checkpoint) must fill whatever cache the foreground path
+    reads from, calling checkpoint() between stages. checkpoint blocks while a
+    foreground request is running and raises PrefetchCancelled once a newer selection
+    has superseded the prefetch.
+    """
+
+    def __init__(self, compute, size=3, shape=(70, 70), workers=1):
+        self.compute = compute
+        self.size = size  # prefetch a size x size block around each selection
+        self.shape = shape
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.generation = 0
+        self.futures = []
+        self.done = set()  # prefetched spaxels not requested yet
+        self.issued = 0
+        self.completed = 0
+        self.used = 0
+        self.wasted = 0
+        self._foreground = 0
+        self._idle = threading.Condition()
+        self._lock = threading.Lock()
+
+    def neighbors(self, x, y):
+        """The size x size block around (x, y), closest first, without (x, y) itself: the
+        foreground job renders the selection, so prefetching it would only compete with it."""
+        r = self.size // 2
+        offsets = [(dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1) if dx or dy]
+        offsets.sort(key=lambda d: d[0] ** 2 + d[1] ** 2)
+        return [(x + dx, y + dy) for dx, dy in offsets
+                if 0 <= x + dx < self.shape[0] and 0 <= y + dy < self.shape[1]]
+
+    def schedule(self, filename, x, y):
+        """Drop outstanding prefetches and queue the neighborhood of (x, y)."""
+        targets = [(filename, nx, ny) for nx, ny in self.neighbors(x, y)]
+        with self._lock:
+            self.generation += 1
+            generation = self.generation
+            for future in self.futures:
+                future.cancel()
+            # Prefetched spaxels that are no longer next to the selection count as wasted; the
+            # selection itself stays, for record_request to count once it is played
+            stale = self.done - set(targets) - {(filename, x, y)}
+            self.wasted += len(stale)
+            self.done -= stale
+            targets = [t for t in targets if t not in self.done]
+            self.issued += len(targets)
+            self.futures = [self.executor.submit(self._run, generation, t) for t in targets]
+
+    def record_request(self, filename, x, y):
+        """Call for every foreground request so hits on prefetched spaxels are counted."""
+        with self._lock:
+            if (filename, x, y) in self.done:
+                self.done.discard((filename, x, y))
+                self.used += 1
+
+    def foreground(self):
+        """Context manager held around foreground work; prefetches pause while it is active."""
+        return _Foreground(self)
+
+    def checkpoint(self, generation):
+        with self._idle:
+            self._idle.wait_for(lambda: self._foreground == 0)
+        if generation != self.generation:
+            raise PrefetchCancelled()
+
+    def _run(self, generation, target):
+        try:
+            self.checkpoint(generation)
+            self.compute(*target, lambda: self.checkpoint(generation))
+        except PrefetchCancelled:
+            return
+        except Exception as e:
+            print(f"Prefetch of {target} failed: {e}")
+            return
+        with self._lock:
+            self.completed += 1
+            self.done.add(target)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "issued": self.issued,
+                "completed": self.completed,
+                "used": self.used,
+                "wasted": self.wasted,
+                "pending_unused": len(self.done),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self.generation += 1
+            for future in self.futures:
+                future.cancel()
+        self.executor.shutdown(wait=False)
+
+
+class _Foreground:
+    def __init__(self, prefetcher):
+        self.prefetcher = prefetcher
+
+    def __enter__(self):
+        with self.prefetcher._idle:
+            self.prefetcher._foreground += 1
+
+    def __exit__(self, *exc):
+        with self.prefetcher._idle:
+            self.prefetcher._foreground -= 1
+            self.prefetcher._idle.notify_all()
+
+
+if __name__ == "__main__":
+    # Self-check of the used / wasted accounting: select a spaxel, let its neighbours be
+    # prefetched, then select and play one of them
+    prefetcher = Prefetcher(lambda filename, x, y, checkpoint: None, size=3)
+    prefetcher.schedule("cube.fits", 10, 10)
+    for future in prefetcher.futures:
+        future.result()
+    prefetcher.schedule("cube.fits", 11, 10)
+    prefetcher.record_request("cube.fits", 11, 10)
+    stats = prefetcher.stats()
+    prefetcher.shutdown()
+    # (9, 9), (9, 10) and (9, 11) are no longer neighbours; (11, 10) was played
+    assert stats["used"] == 1 and stats["wasted"] == 3, stats
+    print(f"✅ Prefetch accounting: {stats}")
@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import argparse
+import warnings
+import threading
+from collections import namedtuple
+import numpy as np
+from spaxel_store import open_store, DONOTUSE, ROWS_PER_BLOCK
+
+
+SPAXELS_PER_BLOCK = 512  # spaxels gathered per step while co-adding
+
+# Co-added spectra: flux and ivar are (n_groups, nwave), the inverse-variance weighted
+# mean flux of each group of spaxels and its inverse variance
+Coadd = namedtuple("Coadd", "wave wave_rest redshift flux ivar")
+
+# Primary header keywords holding the redshift, else the DRPALL catalogue row of the
+# cube's PLATEIFU when COSMIC_DRPALL points at one (e.g. drpall-v3_1_1.fits)
+REDSHIFT_KEYS = ('Z', 'NSA_Z', 'REDSHIFT')
+DRPALL_PATH = os.environ.get("COSMIC_DRPALL", "")
+_drpall = None  # PLATEIFU -> NSA redshift, read on first use
+_drpall_lock = threading.Lock()
+
+
+# ===== Regions =====
+# Boolean [x, y] masks, indexed like get_spaxel_spectrum(x, y); shape is the cube's
+# (see cube_shape). Index lists (xs, ys) are accepted wherever a region is.
+
+def cube_shape(filename):
+    """(n_x, n_y) of the spaxel grid."""
+    store = open_store(filename)
+    if store is not None:
+        return store.shape[:2]
+    from classify_cube import cube_shape as fits_shape
+    return fits_shape(filename)[:2]
+
+
+def _radius(shape, x, y):
+    gx, gy = np.mgrid[:shape[0], :shape[1]]
+    return np.hypot(gx - x, gy - y)
+
+
+def square(shape, x, y, half_size):
+    """Spaxels at most half_size away from (x, y) along both axes."""
+    gx, gy = np.mgrid[:shape[0], :shape[1]]
+    return (np.abs(gx - x) <= half_size) & (np.abs(gy - y) <= half_size)
+
+
+def circle(shape, x, y, radius):
+    return _radius(shape, x, y) <= radius
+
+
+def annulus(shape, x, y, r_inner, r_outer):
+    r = _radius(shape, x, y)
+    return (r >= r_inner) & (r < r_outer)
+
+
+def as_indices(region):
+    """(xs, ys) of a boolean mask or of index lists."""
+    if isinstance(region, np.ndarray) and region.dtype == bool:
+        return np.nonzero(region)
+    xs, ys = region
+    return np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+
+
+def members(bins):
+    """(xs, ys) of every bin of an int [x, y] bin map (-1 = no bin), in bin order."""
+    xs, ys = np.nonzero(bins >= 0)
+    labels = bins[xs, ys]
+    order = np.argsort(labels, kind="stable")
+    splits = np.searchsorted(labels[order], np.arange(1, bins.max() + 1))
+    return list(zip(np.split(xs[order], splits), np.split(ys[order], splits)))
+
+
+# ===== Cube access =====
+
+def _drpall_redshifts():
+    global _drpall
+    with _drpall_lock:
+        if _drpall is None:
+            from astropy.io import fits
+            with fits.open(DRPALL_PATH, memmap=True) as hdul:
+                table = hdul[1].data
+                _drpall = dict(zip(np.char.strip(table['plateifu']).tolist(), table['nsa_z'].astype(np.float64).tolist()))
+    return _drpall
+
+
+def header_redshift(header):
+    """The redshift from a cube's primary header or the DRPALL catalogue, or None if neither has it."""
+    redshifts = [header.get(key) for key in REDSHIFT_KEYS]
+    if DRPALL_PATH and 'PLATEIFU' in header:
+        redshifts.append(_drpall_redshifts().get(str(header['PLATEIFU']).strip()))
+    for z in redshifts:
+        # DRPALL marks a missing NSA redshift with -9999
+        if isinstance(z, (int, float)) and np.isfinite(z) and z > -1:
+            return float(z)
+    return None
+
+
+class CubeArrays:
+    """Flux, inverse variance and mask of many spaxels at once.
+
+    Reads the spaxel store when there is one, else the memory-mapped FITS extensions
+    with the redshift from header_redshift. Only when that finds none is the lime cube
+    loaded for it, as in get_spaxel_spectrum.
+    """
+
+    def __init__(self, filename):
+        self.store = open_store(filename)
+        self.hdul = None
+        if self.store is not None:
+            self.wave, self.wave_rest, self.redshift = self.store.wave, self.store.wave_rest, self.store.redshift
+            return
+        from astropy.io import fits
+        from cube_cache import get_cube
+        self.hdul = fits.open(filename, memmap=True)
+        self.wave = np.asarray(self.hdul['WAVE'].data, dtype=np.float64)
+        self.redshift = header_redshift(self.hdul[0].header)
+        if self.redshift is not None:
+            self.wave_rest = self.wave / (1 + self.redshift)
+            return
+        cube = get_cube(filename)
+        self.wave_rest = cube.wave_rest.data
+        self.redshift = cube.redshift
+
+    def gather(self, xs, ys):
+        """(flux, ivar, mask) of the spaxels (xs[i], ys[i]) as (n, nwave) arrays."""
+        if self.store is not None:
+            return self.store.flux[xs, ys], self.store.ivar[xs, ys], self.store.mask[xs, ys]
+        return tuple(np.asarray(self.hdul[ext].data[:, xs, ys]).T for ext in ('FLUX', 'IVAR', 'MASK'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.hdul is not None:
+            self.hdul.close()
+
+
+def _weights(ivar, mask):
+    return np.where((ivar > 0) & ((mask & DONOTUSE) == 0), ivar, 0).astype(np.float64)
+
+
+def coadd(filename, groups):
+    """Inverse-variance weighted mean spectrum of each group of spaxels, in one pass over the cube.
+
+    groups is a list of regions. Pixels with ivar <= 0 or the DONOTUSE bit get no
+    weight; a pixel without weight in the whole group comes out as flux 0, ivar 0.
+    """
+    groups = [as_indices(group) for group in groups]
+    xs = np.concatenate([g[0] for g in groups]).astype(np.int64)
+    ys = np.concatenate([g[1] for g in groups]).astype(np.int64)
+    labels = np.repeat(np.arange(len(groups)), [len(g[0]) for g in groups])
+
+    with CubeArrays(filename) as cube:
+        nwave = len(cube.wave)
+        weight_sum = np.zeros((len(groups), nwave))
+        flux_sum = np.zeros((len(groups), nwave))
+        # labels are sorted, so each block reduces into consecutive groups
+        for i0 in range(0, len(xs), SPAXELS_PER_BLOCK):
+            i1 = min(i0 + SPAXELS_PER_BLOCK, len(xs))
+            flux, ivar, mask = cube.gather(xs[i0:i1], ys[i0:i1])
+            weight = _weights(ivar, mask)
+            block_labels = labels[i0:i1]
+            present, starts = np.unique(block_labels, return_index=True)
+            weight_sum[present] += np.add.reduceat(weight, starts, axis=0)
+            flux_sum[present] += np.add.reduceat(weight * flux, starts, axis=0)
+        mean = np.divide(flux_sum, weight_sum, out=np.zeros_like(flux_sum), where=weight_sum > 0)
+        return Coadd(cube.wave, cube.wave_rest, cube.redshift, mean.astype(np.float32), weight_sum.astype(np.float32))
+
+
+def vote_labels(filename, xs, ys):
+    """Each sample's most common component among the region's classified spaxels in the label
+    cube (see spectrum.COMPONENT_LUT), or None without a label cube or classified spaxels."""
+    from classify_cube import load_label_cube, UNCLASSIFIED
+    from spectrum import COMPONENT_LUT, NO_COMPONENT
+    label_cube = load_label_cube(filename)
+    if label_cube is None:
+        return None
+    labels = label_cube[xs, ys]
+    labels = COMPONENT_LUT[labels[labels[:, 0] != UNCLASSIFIED]]
+    if len(labels) == 0:
+        return None
+    counts = np.stack([np.count_nonzero(labels == k, axis=0) for k in range(4)])
+    return np.where(counts.max(axis=0) > 0, counts.argmax(axis=0), NO_COMPONENT).astype(np.uint8)
+
+
+# ===== Voronoi S/N bins =====
+
+def sn_map(filename):
+    """Median signal and noise (from ivar) of every spaxel, as [x, y] maps; NaN without good pixels."""
+    shape = cube_shape(filename)
+    signal = np.full(shape, np.nan)
+    noise = np.full(shape, np.nan)
+    with CubeArrays(filename) as cube, warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN spaxels outside the IFU
+        for x0 in range(0, shape[0], ROWS_PER_BLOCK):
+            x1 = min(x0 + ROWS_PER_BLOCK, shape[0])
+            xs, ys = (a.ravel() for a in np.mgrid[x0:x1, :shape[1]])
+            flux, ivar, mask = cube.gather(xs, ys)
+            good = _weights(ivar, mask) > 0
+            signal[xs, ys] = np.nanmedian(np.where(good, flux, np.nan), axis=1)
+            noise[xs, ys] = np.nanmedian(np.where(good, 1 / np.sqrt(np.where(good, ivar, 1)), np.nan), axis=1)
+    return signal, noise
+
+
+def _nearest(points, centers, block=SPAXELS_PER_BLOCK):
+    return np.concatenate([np.argmin(((points[i:i + block, None] - centers[None]) ** 2).sum(axis=-1), axis=1)
+                           for i in range(0, len(points), block)])
+
+
+def voronoi_bins(signal, noise, target_sn):
+    """Int [x, y] bin map (-1 without data) with bins of about target_sn.
+
+    A simplified Cappellari & Copin (2003): starting from the highest-S/N spaxel not yet
+    binned, a bin takes the unbinned spaxel nearest its centroid until it reaches target_sn
+    (S/N = sum(signal) / sqrt(sum(noise**2))). Every spaxel then goes to the nearest bin
+    centroid, which turns the bins into Voronoi cells.
+    """
+    valid = np.isfinite(signal) & np.isfinite(noise) & (noise > 0)
+    xs, ys = np.nonzero(valid)
+    s, n2 = signal[valid], noise[valid] ** 2
+    points = np.column_stack([xs, ys]).astype(np.float64)
+    unbinned = np.ones(len(s), dtype=bool)
+    sn = s / np.sqrt(n2)
+    centroids = []
+    while unbinned.any():
+        left = np.flatnonzero(unbinned)
+        member = left[np.argmax(sn[left])]
+        unbinned[member] = False
+        total_s, total_n2, total_pos, size = s[member], n2[member], points[member].copy(), 1
+        while total_s / np.sqrt(total_n2) < target_sn and unbinned.any():
+            left = np.flatnonzero(unbinned)
+            member = left[np.argmin(((points[left] - total_pos / size) ** 2).sum(axis=1))]
+            unbinned[member] = False
+            total_s, total_n2, total_pos, size = total_s + s[member], total_n2 + n2[member], total_pos + points[member], size + 1
+        centroids.append(total_pos / size)
+
+    # Number the cells that ended up with spaxels consecutively
+    _, cells = np.unique(_nearest(points, np.array(centroids)), return_inverse=True)
+    bins = np.full(signal.shape, -1, dtype=np.int64)
+    bins[xs, ys] = cells
+    return bins
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sonify regions of a MaNGA cube as single co-added spectra.")
+    parser.add_argument("cube", help="LOGCUBE FITS file")
+    shape_group = parser.add_mutually_exclusive_group(required=True)
+    shape_group.add_argument("--square", nargs=3, type=float, metavar=("X", "Y", "HALF_SIZE"))
+    shape_group.add_argument("--circle", nargs=3, type=float, metavar=("X", "Y", "RADIUS"))
+    shape_group.add_argument("--annulus", nargs=4, type=float, metavar=("X", "Y", "R_INNER", "R_OUTER"))
+    shape_group.add_argument("--all", action="store_true", help="every spaxel: the whole galaxy")
+    shape_group.add_argument("--voronoi", type=float, metavar="SN", help="Voronoi bins of this S/N, one WAV per bin")
+    parser.add_argument("--classify", choices=("infer", "labels", "auto"), default="infer",
+                        help="run the model on the co-added spectrum, or vote with the label cube (default: infer)")
+    parser.add_argument("--duration", type=float, default=None, help="decimate to about this many seconds of audio")
+    parser.add_argument("--backend", default="numpy", help="render backend: numpy, fluidsynth or pool (default: numpy)")
+    parser.add_argument("-o", "--out", default="region.wav", help="output WAV, or directory for --voronoi (default: region.wav)")
+    args = parser.parse_args()
+
+    from spaxel_to_wav import get_region_spectra
+    from sonify import sonify_spectrum_to_wav
+    start = time.perf_counter()
+    shape = cube_shape(args.cube)
+    if args.voronoi:
+        bins = voronoi_bins(*sn_map(args.cube), args.voronoi)
+        groups = members(bins)
+        os.makedirs(args.out, exist_ok=True)
+        np.save(os.path.join(args.out, "bins.npy"), bins)
+        outputs = [os.path.join(args.out, f"bin_{k:03d}.wav") for k in range(len(groups))]
+    else:
+        if args.all:
+            mask = np.ones(shape, dtype=bool)
+        elif args.square:
+            mask = square(shape, *args.square)
+        elif args.circle:
+            mask = circle(shape, *args.circle)
+        else:
+            mask = annulus(shape, *args.annulus)
+        groups, outputs = [mask], [args.out]
+
+    spectra = get_region_spectra(args.cube, groups, args.classify)
+    for spectrum, wav_path in zip(spectra, outputs):
+        sonify_spectrum_to_wav(spectrum, midi_path=f"{wav_path}.mid", wav_path=wav_path, backend=args.backend,
+                               target_duration=args.duration)
+    print(f"{len(groups)} regions, {sum(len(g[0]) for g in groups)} spaxels in {time.perf_counter() - start:.1f} s", file=sys.stderr)
@@ -0,0 +1,132 @@
+import os
+import time
+import json
+import uuid
+import wave
+import hashlib
+import numpy as np
+
+
+DEFAULT_DIR = os.environ.get("COSMIC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cosmic-composers"))
+DEFAULT_MAX_BYTES = int(os.environ.get("COSMIC_CACHE_BYTES", 2 * 1024**3))
+CACHE_VERSION = 1  # bump when the pipeline output changes for the same inputs
+STALE_TMP_SECONDS = 3600  # temporary files left behind by crashed writers
+
+
+def file_identity(filename):
+    """Path, size and mtime of a file, so edits or replacements give new keys."""
+    st = os.stat(filename)
+    return [os.path.abspath(filename), st.st_size, st.st_mtime_ns]
+
+
+class RenderCache:
+    """Content-addressed store of rendered audio and plots, shared safely between processes.
+
+    Entries are written to a temporary file in the cache directory and moved into place
+    with os.replace, so readers only ever see complete files. Recency is tracked with
+    the file mtime (touched on every hit) and the oldest entries are evicted once the
+    directory grows past max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, **params):
+        blob = json.dumps({"version": CACHE_VERSION, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def spaxel_key(self, filename, x, y, **params):
+        return self.key(cube=file_identity(filename), x=int(x), y=int(y), **params)
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def get(self, key, ext):
+        """Path of a cached entry, or None. A hit marks the entry as recently used."""
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def tmp_path(self, ext):
+        """A private path inside the cache directory to render into before commit()."""
+        return os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}.{ext}")
+
+    def commit(self, tmp_path, key, ext):
+        path = self.path(key, ext)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def tee_wav(self, chunks, key, sample_rate, finish=None):
+        """Pass float32 chunks through while writing them to the cache; only a fully consumed stream is committed.
+
+        finish(path), if given, rewrites the complete WAV in place before it is committed
+        (e.g. postprocess.process_wav, so the entry matches a non-streamed render).
+        """
+        tmp_path = self.tmp_path("wav")
+        done = False
+        try:
+            with wave.open(tmp_path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(sample_rate)
+                for chunk in chunks:
+                    wf.writeframes((np.clip(chunk, -1, 1) * 32767).astype("<i2").tobytes())
+                    yield chunk
+            if finish is not None:
+                finish(tmp_path)
+            done = True
+            self.commit(tmp_path, key, "wav")
+        finally:
+            if not done and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _entries(self):
+        entries = []
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                    if entry.name.startswith(".tmp-"):
+                        if now - st.st_mtime > STALE_TMP_SECONDS:
+                            os.remove(entry.path)
+                        continue
+                except FileNotFoundError:
+                    continue  # removed by another process
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
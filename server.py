@@ -0,0 +1,262 @@
+import io
+import os
+import sys
+import json
+import shutil
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import tornado.web
+import tornado.websocket
+from render_cache import RenderCache
+import band_images
+
+
+MAX_PENDING = 64  # distinct computations queued or running before requests are turned away
+
+
+class Overloaded(Exception):
+    pass
+
+
+# ===== Worker side =====
+# Every request renders into its own temporary directory and cache entries appear via
+# os.replace, so concurrent requests never share a file name.
+
+def render_audio(filename, x, y, backend, max_notes, soundfont_path, key):
+    """Worker: extract, classify and sonify one spaxel into the render cache. Returns the cached WAV path."""
+    from spaxel_to_wav import get_spaxel_spectrum
+    from sonify import sonify_spectrum_to_wav
+    cache = RenderCache()
+    work_dir = tempfile.mkdtemp(prefix="cosmic-request-")
+    try:
+        tmp_path = cache.tmp_path("wav")
+        with contextlib.redirect_stdout(io.StringIO()):
+            sonify_spectrum_to_wav(get_spaxel_spectrum(filename, x, y), midi_path=os.path.join(work_dir, "spectrum.mid"),
+                                   wav_path=tmp_path, soundfont_path=soundfont_path, backend=backend, max_notes=max_notes)
+        return cache.commit(tmp_path, key, "wav")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def render_plot(filename, x, y, key):
+    """Worker: plot one spaxel's spectrum into the render cache. Returns the cached PNG path."""
+    from spaxel_to_wav import get_spaxel_spectrum
+    from spectrum_plot import get_plotter
+    cache = RenderCache()
+    tmp_path = cache.tmp_path("png")
+    get_plotter().save(get_spaxel_spectrum(filename, x, y), x, y, tmp_path)
+    return cache.commit(tmp_path, key, "png")
+
+
+# ===== Service =====
+
+class SonificationService:
+    """Spaxel audio and plots for many clients, computed on a bounded process pool.
+
+    Results live in the shared render cache (the same keys as the frontend). Identical
+    requests that arrive while one is being computed wait for that computation instead
+    of starting their own.
+    """
+
+    def __init__(self, galaxy_dir=".", workers=None, backend="numpy", soundfont_path="FluidR3_GM.sf2", max_pending=MAX_PENDING):
+        self.galaxy_dir = galaxy_dir
+        self.backend = backend
+        self.soundfont_path = soundfont_path
+        self.max_pending = max_pending
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.cache = RenderCache()
+        self.inflight = {}  # (key, ext) -> future of the cached path
+        self.counts = {"requests": 0, "cache_hits": 0, "coalesced": 0, "computed": 0, "rejected": 0, "failed": 0}
+
+    def galaxies(self):
+        """Names of the cubes in galaxy_dir that have a preview."""
+        return [os.path.basename(png)[:-4] for png in band_images.discover(self.galaxy_dir)]
+
+    def cube_file(self, name):
+        """Path of a listed cube; anything else (including other paths) is a KeyError."""
+        filename = os.path.join(self.galaxy_dir, os.path.basename(name))
+        if name != os.path.basename(name) or not name.endswith(".fits") or not os.path.isfile(filename):
+            raise KeyError(name)
+        return filename
+
+    def audio_key(self, filename, x, y, backend, max_notes):
+        from sonify import mapping_params
+        return self.cache.spaxel_key(filename, x, y, kind="audio", backend=backend, mapping=mapping_params(max_notes))
+
+    async def audio(self, name, x, y, backend=None, duration=None):
+        from sonify import notes_for_duration, RENDER_BACKENDS
+        backend = backend or self.backend
+        if backend not in RENDER_BACKENDS:
+            raise ValueError(f"unknown backend {backend!r}")
+        filename = self.cube_file(name)
+        max_notes = notes_for_duration(duration) if duration else None
+        key = self.audio_key(filename, x, y, backend, max_notes)
+        return await self._cached(key, "wav", render_audio, filename, x, y, backend, max_notes, self.soundfont_path, key)
+
+    async def plot(self, name, x, y):
+        filename = self.cube_file(name)
+        key = self.cache.spaxel_key(filename, x, y, kind="plot")
+        return await self._cached(key, "png", render_plot, filename, x, y, key)
+
+    async def _cached(self, key, ext, render, *args):
+        self.counts["requests"] += 1
+        path = self.cache.get(key, ext)
+        if path is not None:
+            self.counts["cache_hits"] += 1
+            return path
+        future = self.inflight.get((key, ext))
+        if future is not None:
+            self.counts["coalesced"] += 1
+        else:
+            if len(self.inflight) >= self.max_pending:
+                self.counts["rejected"] += 1
+                raise Overloaded(f"{len(self.inflight)} renders pending")
+            self.counts["computed"] += 1
+            future = asyncio.get_running_loop().run_in_executor(self.pool, render, *args)
+            self.inflight[(key, ext)] = future
+            future.add_done_callback(lambda f: self._finished((key, ext), f))
+        # A client that goes away must not cancel the render other clients are waiting for
+        return await asyncio.shield(future)
+
+    def _finished(self, inflight_key, future):
+        self.inflight.pop(inflight_key, None)
+        if not future.cancelled() and future.exception() is not None:
+            self.counts["failed"] += 1
+
+    def stats(self):
+        return {**self.counts, "inflight": len(self.inflight), "cache": self.cache.stats()}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ===== HTTP / WebSocket =====
+
+def spaxel_params(handler):
+    """backend and duration (seconds) from the query string."""
+    duration = handler.get_query_argument("duration", None)
+    return handler.get_query_argument("backend", None), float(duration) if duration else None
+
+
+class ServiceHandler(tornado.web.RequestHandler):
+    def initialize(self, service):
+        self.service = service
+
+    async def send_file(self, render, content_type):
+        try:
+            path = await render
+        except KeyError as e:
+            raise tornado.web.HTTPError(404, f"unknown cube {e}")
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e))
+        except Overloaded as e:
+            raise tornado.web.HTTPError(503, str(e))
+        self.set_header("Content-Type", content_type)
+        with open(path, "rb") as f:
+            self.write(f.read())
+
+
+class GalaxiesHandler(ServiceHandler):
+    def get(self):
+        self.write({"galaxies": self.service.galaxies()})
+
+
+class PreviewHandler(ServiceHandler):
+    def get(self, name):
+        try:
+            png = band_images.preview_path(self.service.cube_file(name))
+        except KeyError:
+            raise tornado.web.HTTPError(404)
+        self.set_header("Content-Type", "image/png")
+        with open(png, "rb") as f:
+            self.write(f.read())
+
+
+class AudioHandler(ServiceHandler):
+    async def get(self, name, x, y):
+        backend, duration = spaxel_params(self)
+        await self.send_file(self.service.audio(name, int(x), int(y), backend, duration), "audio/wav")
+
+
+class PlotHandler(ServiceHandler):
+    async def get(self, name, x, y):
+        await self.send_file(self.service.plot(name, int(x), int(y)), "image/png")
+
+
+class StatsHandler(ServiceHandler):
+    def get(self):
+        self.write(self.service.stats())
+
+
+class SpaxelSocket(tornado.websocket.WebSocketHandler):
+    """Send {"id", "cube", "x", "y", "backend"?, "duration"?}; the reply carries URLs of the rendered audio and plot.
+
+    A "rendering" message acknowledges each request before the work starts.
+    """
+
+    def initialize(self, service):
+        self.service = service
+
+    async def on_message(self, message):
+        request = {}
+        try:
+            request = json.loads(message)
+            name, x, y = request["cube"], int(request["x"]), int(request["y"])
+            backend, duration = request.get("backend"), request.get("duration")
+            self.write_message({"id": request.get("id"), "status": "rendering"})
+            await asyncio.gather(self.service.plot(name, x, y), self.service.audio(name, x, y, backend, duration))
+            query = "&".join(f"{k}={v}" for k, v in (("backend", backend), ("duration", duration)) if v)
+            self.write_message({
+                "id": request.get("id"),
+                "status": "done",
+                "audio": f"/spaxel/{name}/{x}/{y}/audio.wav" + (f"?{query}" if query else ""),
+                "plot": f"/spaxel/{name}/{x}/{y}/plot.png",
+            })
+        except tornado.websocket.WebSocketClosedError:
+            pass
+        except Exception as e:
+            error = f"unknown cube {e}" if isinstance(e, KeyError) and "cube" in request else str(e)
+            with contextlib.suppress(tornado.websocket.WebSocketClosedError):
+                self.write_message({"id": request.get("id") if isinstance(request, dict) else None, "status": "error", "error": error})
+
+
+def make_app(service):
+    args = dict(service=service)
+    return tornado.web.Application([
+        (r"/galaxies", GalaxiesHandler, args),
+        (r"/galaxies/([^/]+)/preview\.png", PreviewHandler, args),
+        (r"/spaxel/([^/]+)/(\d+)/(\d+)/audio\.wav", AudioHandler, args),
+        (r"/spaxel/([^/]+)/(\d+)/(\d+)/plot\.png", PlotHandler, args),
+        (r"/stats", StatsHandler, args),
+        (r"/ws", SpaxelSocket, args),
+    ])
+
+
+async def serve(args):
+    service = SonificationService(args.galaxy_dir, args.workers, args.backend, args.soundfont, args.max_pending)
+    make_app(service).listen(args.port, address=args.address)
+    print(f"Serving {len(service.galaxies())} galaxies from {os.path.abspath(args.galaxy_dir)} on http://{args.address}:{args.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve spaxel sonifications over HTTP and WebSocket.")
+    parser.add_argument("--port", type=int, default=8888, help="port to listen on (default: 8888)")
+    parser.add_argument("--address", default="127.0.0.1", help="address to bind, 0.0.0.0 for the whole network (default: 127.0.0.1)")
+    parser.add_argument("--galaxy-dir", default=os.environ.get("COSMIC_GALAXY_DIR", "."), help="directory of cubes and previews (default: COSMIC_GALAXY_DIR or .)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--backend", default="numpy", help="default render backend: numpy, fluidsynth or pool (default: numpy)")
+    parser.add_argument("--soundfont", default="FluidR3_GM.sf2", help="SoundFont for the fluidsynth backends")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help=f"renders queued or running before answering 503 (default: {MAX_PENDING})")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
@@ -1,115 +1,413 @@
 import mido
 from mido import Message, MidiFile, MidiTrack
 import numpy as np
+from collections import namedtuple
 from midi2audio import FluidSynth
-import matplotlib.pyplot as plt
+import synth
+import postprocess
+from spectrum import SpaxelSpectrum, CONTINUUM, EMISSION, ABSORPTION, COSMIC_RAY
+from tracing import span, count, traced
 # from pydub import AudioSegment
 
+# Note duration for smoother sound (longer duration for overlapping sounds)
+NOTE_DURATION = 500  # 500ms (0.5 seconds)
+# Apply pitch bends for smoother transitions
+PITCH_BEND_RANGE = 8191  # Maximum allowed pitch bend
+TEMPO = 50000  # microseconds per beat (120 BPM)
+TICKS_PER_BEAT = 480  # mido's default resolution
+TICK_SECONDS = TEMPO / 1e6 / TICKS_PER_BEAT
+
+# Normalize values to MIDI pitch (21–108) / velocity ranges
+EMISSION_PITCHES = (50, 70)  # Emission (higher notes)
+ABSORPTION_PITCHES = (28, 50)  # Absorption (lower notes)
+CONTINUUM_VELOCITIES = (40, 80)  # Background noise intensity
+COSMIC_VELOCITIES = (80, 127)  # Cosmic rays (higher velocity for impact)
+
+# General MIDI programs per component
+CONTINUUM_PROGRAM = 90  # Pad 3 (polysynth) for ambient sound
+EMISSION_PROGRAM = 73  # Choir (ambient-friendly)
+ABSORPTION_PROGRAM = 92  # String or Synth pad for deep, atmospheric sound
+COSMIC_PROGRAM = 10  # Music Box pings
+
+# MIDI controller for expression (volume changes within a sustained note)
+EXPRESSION_CC = 11
+
+# One instrument track per spectral component. start is the absolute onset of each
+# note in ticks; every note lasts NOTE_DURATION ticks unless duration (ticks per note)
+# is given. bend is the pitchwheel value sent after each note_on (None for no bend).
+# expression is None or (ticks, values) of EXPRESSION_CC changes on the channel.
+Track = namedtuple("Track", "channel program bend start note velocity duration expression", defaults=(None, None))
+
+
+def normalize(arr, out_min, out_max):
+    """Linearly map arr onto the integer range [out_min, out_max] (truncating, like int())."""
+    arr = np.asarray(arr, dtype=float)
+    arr_min, arr_max = arr.min(), arr.max()
+    if arr_max == arr_min:
+        return np.full(arr.shape, out_min, dtype=int)
+    return (out_min + (arr - arr_min) / (arr_max - arr_min) * (out_max - out_min)).astype(int)
+
+
+def normalize_selected(values, n, out_min, out_max):
+    """normalize() of a length-n array that is zero apart from values, returning just the values' part."""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.zeros(0, dtype=int)
+    arr_min, arr_max = values.min(), values.max()
+    if len(values) < n:  # the zeros take part in the range
+        arr_min, arr_max = min(arr_min, 0.0), max(arr_max, 0.0)
+    if arr_max == arr_min:
+        return np.full(values.shape, out_min, dtype=int)
+    return (out_min + (values - arr_min) / (arr_max - arr_min) * (out_max - out_min)).astype(int)
+
+
+def classify_samples(continuum, emission, absorption, cosmic_rays):
+    """Boolean masks picking one component per sample, in continuum > emission > absorption > cosmic ray order."""
+    is_cont = np.asarray(continuum) != 0
+    is_em = ~is_cont & (np.asarray(emission) != 0)
+    is_ab = ~(is_cont | is_em) & (np.asarray(absorption) != 0)
+    is_cr = ~(is_cont | is_em | is_ab) & (np.asarray(cosmic_rays) != 0)
+    return is_cont, is_em, is_ab, is_cr
+
+
+def _back_to_back(n):
+    return np.arange(n) * NOTE_DURATION
+
+
+def notes_for_duration(seconds):
+    """Number of back-to-back notes that fit in a duration."""
+    return max(1, int(seconds / (NOTE_DURATION * TICK_SECONDS)))
+
+
+def decimate_spectrum(wavelength, continuum, emission, absorption, cosmic_rays, max_notes):
+    """Reduce each component to at most max_notes wavelength bins, keeping narrow features.
+
+    Samples are grouped into max_notes contiguous wavelength bins, and every component
+    is reduced into the bins separately with its own statistic (mean continuum, peak
+    emission, deepest absorption, brightest cosmic ray), so a one-sample emission line
+    or spike still becomes a note and no component crowds out another.
+    Returns (bin_wavelength, values, present): values and present are (4, n_bins) in
+    continuum, emission, absorption, cosmic ray order, present saying which bins have
+    samples of the component. Spectra of max_notes samples or fewer keep one bin per sample.
+    """
+    wavelength = np.asarray(wavelength, dtype=float)
+    arrays = [np.asarray(a, dtype=float) for a in (continuum, emission, absorption, cosmic_rays)]
+    masks = np.array(classify_samples(*arrays))
+    n = len(wavelength)
+    if n <= max_notes:
+        return wavelength, np.where(masks, np.array(arrays), 0.0), masks
+
+    starts = np.linspace(0, n, max_notes + 1).astype(int)[:-1]
+    counts = np.add.reduceat(masks.astype(int), starts, axis=1)
+    width = np.diff(starts, append=n)
+    values = np.array([
+        np.add.reduceat(np.where(masks[0], arrays[0], 0.0), starts) / np.maximum(counts[0], 1),
+        np.maximum.reduceat(np.where(masks[1], arrays[1], -np.inf), starts),
+        np.minimum.reduceat(np.where(masks[2], arrays[2], np.inf), starts),
+        np.maximum.reduceat(np.where(masks[3], arrays[3], -np.inf), starts),
+    ])
+    present = counts > 0
+    bin_wavelength = np.add.reduceat(wavelength, starts) / width
+    return bin_wavelength, np.where(present, values, 0.0), present
+
+
+def note_schedule(wavelength, continuum=None, emission=None, absorption=None, cosmic_rays=None, max_notes=None):
+    """Map the four spectral components onto four Tracks of notes.
+
+    Takes either the wavelength and four zero-filled component arrays, or a single
+    SpaxelSpectrum (whose labels already say which samples belong to which component).
+
+    With max_notes, each component is first decimated into its own bins (see
+    decimate_spectrum) and every note, cosmic ray pings included, starts at its bin's
+    position, so the tracks share one time line of max_notes notes.
+    """
+    if isinstance(wavelength, SpaxelSpectrum) and max_notes is None:
+        spectrum = wavelength
+        flux, n = spectrum.flux, len(spectrum)
+        em, ab, cont, cr = (spectrum.indices(k) for k in (EMISSION, ABSORPTION, CONTINUUM, COSMIC_RAY))
+
+        # Normalize values to MIDI pitch / velocity
+        pitches_emission = normalize_selected(flux[em], n, *EMISSION_PITCHES)
+        pitches_absorption = normalize_selected(flux[ab], n, *ABSORPTION_PITCHES)
+        velocities_bg = normalize_selected(flux[cont], n, *CONTINUUM_VELOCITIES)
+        velocities_cosmic = normalize_selected(flux[cr], n, *COSMIC_VELOCITIES) // 2
+    else:
+        if isinstance(wavelength, SpaxelSpectrum):
+            wavelength, _, continuum, emission, absorption, cosmic_rays = wavelength.as_arrays()
+        if max_notes is not None:
+            # Every component keeps its own bins; notes start at their bin's onset, so the
+            # tracks line up in wavelength and none runs past max_notes notes
+            _, values, present = decimate_spectrum(wavelength, continuum, emission, absorption, cosmic_rays, max_notes)
+            n_bins = present.shape[1]
+            cont, em, ab, cr = (np.flatnonzero(p) for p in present)
+            velocities_bg = normalize_selected(values[0, cont], n_bins, *CONTINUUM_VELOCITIES)
+            pitches_emission = normalize_selected(values[1, em], n_bins, *EMISSION_PITCHES)
+            pitches_absorption = normalize_selected(values[2, ab], n_bins, *ABSORPTION_PITCHES)
+            velocities_cosmic = normalize_selected(values[3, cr], n_bins, *COSMIC_VELOCITIES) // 2
+            starts = [idx * NOTE_DURATION for idx in (cont, em, ab, cr)]
+        else:
+            # One component per wavelength sample
+            is_cont, is_em, is_ab, is_cr = classify_samples(continuum, emission, absorption, cosmic_rays)
+            cr = np.flatnonzero(is_cr)
+
+            # Normalize values to MIDI pitch / velocity
+            pitches_emission = normalize(emission, *EMISSION_PITCHES)[is_em]
+            pitches_absorption = normalize(absorption, *ABSORPTION_PITCHES)[is_ab]
+            velocities_bg = normalize(continuum, *CONTINUUM_VELOCITIES)[is_cont]
+            velocities_cosmic = normalize(cosmic_rays, *COSMIC_VELOCITIES)[is_cr] // 2
+
+    n_bg, n_em, n_ab = len(velocities_bg), len(pitches_emission), len(pitches_absorption)
+    if max_notes is None:
+        # Cosmic ray spikes wait 100 ticks per wavelength sample after the previous ping
+        cr_delays = cr * 100
+        starts = [_back_to_back(n_bg), _back_to_back(n_em), _back_to_back(n_ab), np.cumsum(cr_delays) + _back_to_back(len(cr_delays))]
+
+    return [
+        Track(0, CONTINUUM_PROGRAM, None, starts[0], np.full(n_bg, 50), velocities_bg),
+        Track(1, EMISSION_PROGRAM, PITCH_BEND_RANGE, starts[1], pitches_emission, np.full(n_em, 70)),
+        Track(2, ABSORPTION_PROGRAM, PITCH_BEND_RANGE, starts[2], pitches_absorption, np.full(n_ab, 100)),
+        Track(3, COSMIC_PROGRAM, None, starts[3], np.full(len(cr), 85), velocities_cosmic),
+    ]
+
+
+def coalesce_track(track):
+    """Merge runs of back-to-back notes at the same pitch into single sustained notes.
+
+    Each run keeps its onset and end time and plays at the run's highest velocity; the
+    per-sample velocities become expression changes at the original onsets, scaled so
+    the loudness matches. Tracks that are already coalesced are returned unchanged.
+    """
+    n = len(track.start)
+    if n < 2 or track.duration is not None:
+        return track
+    note, velocity, start = np.asarray(track.note), np.asarray(track.velocity), np.asarray(track.start)
+
+    # A run continues while the next note starts as this one ends, at the same pitch
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = (note[1:] != note[:-1]) | (start[1:] != start[:-1] + NOTE_DURATION)
+    firsts = np.flatnonzero(new_run)
+    lasts = np.append(firsts[1:], n) - 1
+    run_velocity = np.maximum.reduceat(velocity, firsts)
+
+    # Expression level of every original note relative to its run, sent where it changes
+    level = np.clip(np.round(127 * velocity / np.maximum(run_velocity, 1)[np.cumsum(new_run) - 1]), 1, 127).astype(int)
+    changed = np.empty(n, dtype=bool)
+    changed[0] = level[0] != 127
+    changed[1:] = level[1:] != level[:-1]
+    expression = (start[changed], level[changed]) if changed.any() else None
+
+    return track._replace(start=start[firsts], note=note[firsts], velocity=run_velocity,
+                          duration=start[lasts] + NOTE_DURATION - start[firsts], expression=expression)
+
+
+def coalesce_tracks(tracks):
+    return [coalesce_track(track) for track in tracks]
+
+
+def mapping_params(max_notes=None):
+    """Everything that shapes the rendered audio, e.g. for cache keys."""
+    return {
+        "max_notes": max_notes,
+        "note_duration": NOTE_DURATION,
+        "tempo": TEMPO,
+        "ticks_per_beat": TICKS_PER_BEAT,
+        "pitch_bend": PITCH_BEND_RANGE,
+        "emission_pitches": EMISSION_PITCHES,
+        "absorption_pitches": ABSORPTION_PITCHES,
+        "continuum_velocities": CONTINUUM_VELOCITIES,
+        "cosmic_velocities": COSMIC_VELOCITIES,
+        "programs": (CONTINUUM_PROGRAM, EMISSION_PROGRAM, ABSORPTION_PROGRAM, COSMIC_PROGRAM),
+        "coalesce": True,
+        "decimation": "per_component",
+        "silence_db": postprocess.SILENCE_DB,
+        "peak_db": postprocess.PEAK_DB,
+    }
+
+
+def _note_messages(channel, notes, velocities, delays, bend=None):
+    """note_on / [pitchwheel] / note_off triples for every note, built from plain lists in one pass."""
+    notes, velocities, delays = notes.tolist(), velocities.tolist(), delays.tolist()
+    if bend is None:
+        return [msg for note, velocity, delay in zip(notes, velocities, delays) for msg in (
+            Message('note_on', note=note, velocity=velocity, time=delay, channel=channel),
+            Message('note_off', note=note, velocity=0, time=NOTE_DURATION, channel=channel),
+        )]
+    return [msg for note, velocity, delay in zip(notes, velocities, delays) for msg in (
+        Message('note_on', note=note, velocity=velocity, time=delay, channel=channel),
+        Message('pitchwheel', pitch=bend, time=0, channel=channel),
+        Message('note_off', note=note, velocity=0, time=NOTE_DURATION, channel=channel),
+    )]
+
+
+def _timed_messages(track):
+    """Messages of a track with per-note durations and/or expression changes, in time order."""
+    n = len(track.start)
+    duration = track.duration if track.duration is not None else np.full(n, NOTE_DURATION)
+    exp_ticks, exp_values = track.expression if track.expression is not None else ((), ())
+    # (tick, order within tick, kind, data): note_offs first, then expression, note_on, bend
+    events = [(t, 0, 'note_off', d) for t, d in zip((track.start + duration).tolist(), track.note.tolist())]
+    events += [(t, 1, 'control_change', v) for t, v in zip(np.asarray(exp_ticks).tolist(), np.asarray(exp_values).tolist())]
+    events += [(t, 2, 'note_on', (d, v)) for t, d, v in zip(track.start.tolist(), track.note.tolist(), track.velocity.tolist())]
+    if track.bend is not None:
+        events += [(t, 3, 'pitchwheel', track.bend) for t in track.start.tolist()]
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    messages = []
+    previous = 0
+    for tick, _, kind, data in events:
+        delay, previous = tick - previous, tick
+        if kind == 'note_on':
+            messages.append(Message('note_on', note=data[0], velocity=data[1], time=delay, channel=track.channel))
+        elif kind == 'note_off':
+            messages.append(Message('note_off', note=data, velocity=0, time=delay, channel=track.channel))
+        elif kind == 'control_change':
+            messages.append(Message('control_change', control=EXPRESSION_CC, value=data, time=delay, channel=track.channel))
+        else:
+            messages.append(Message('pitchwheel', pitch=data, time=delay, channel=track.channel))
+    return messages
+
+
+def build_midi(tracks):
+    """Write a note schedule into a MidiFile, one MIDI track per component."""
+    mid = MidiFile(ticks_per_beat=TICKS_PER_BEAT)
+    for k, track in enumerate(tracks):
+        midi_track = MidiTrack()
+        mid.tracks.append(midi_track)
+        if k == 0:
+            midi_track.append(mido.MetaMessage('set_tempo', tempo=TEMPO))
+        midi_track.append(Message('program_change', program=track.program, channel=track.channel))
+
+        if track.duration is not None or track.expression is not None:
+            midi_track.extend(_timed_messages(track))
+            continue
+        # Delta time of each note_on, counted from the previous note_off
+        delays = np.diff(track.start, prepend=-NOTE_DURATION) - NOTE_DURATION
+        midi_track.extend(_note_messages(track.channel, track.note, track.velocity, delays, bend=track.bend))
+    return mid
+
+
+# ===== Render backends =====
+# A backend takes (tracks, midi_path, wav_path, soundfont_path), writes wav_path if
+# given, and returns the float32 samples when it has them in memory (else None).
+# Output is trimmed of leading/trailing silence and peak-normalized (postprocess.py).
+
+def render_fluidsynth(tracks, midi_path, wav_path, soundfont_path):
+    with span("sonify.build_midi"):
+        mid = build_midi(coalesce_tracks(tracks))
+        mid.save(midi_path)
+    count("midi_events", sum(len(t) for t in mid.tracks))
+    with span("sonify.fluidsynth"):
+        fs = FluidSynth(soundfont_path)
+        fs.midi_to_audio(midi_path, wav_path)
+    with span("sonify.postprocess"):
+        postprocess.process_wav(wav_path)
+    print(f"✅ Saved: {midi_path} and {wav_path}")
+    return None
+
+
+def render_numpy(tracks, midi_path, wav_path, soundfont_path):
+    with span("sonify.synth"):
+        # Per-note voices: the synth caches each note's wave, which beats synthesizing long sustained notes
+        samples = synth.render_tracks(tracks, NOTE_DURATION * TICK_SECONDS, TICK_SECONDS)
+    count("samples_rendered", len(samples))
+    with span("sonify.postprocess"):
+        samples = postprocess.process(samples)
+    if wav_path:
+        with span("sonify.write_wav"):
+            synth.write_wav(wav_path, samples)
+        print(f"✅ Saved: {wav_path}")
+    return samples
+
+
+def render_pool(tracks, midi_path, wav_path, soundfont_path):
+    # Persistent FluidSynth workers, see synth_pool.py
+    import synth_pool
+    with span("sonify.pool_render"):
+        pcm = synth_pool.get_pool(soundfont_path).render(coalesce_tracks(tracks), NOTE_DURATION * TICK_SECONDS, TICK_SECONDS)
+    samples = pcm.astype(np.float32) / 32768
+    count("samples_rendered", len(samples))
+    with span("sonify.postprocess"):
+        samples = postprocess.process(samples)
+    if wav_path:
+        with span("sonify.write_wav"):
+            synth.write_wav(wav_path, samples)
+        print(f"✅ Saved: {wav_path}")
+    return samples
+
+
+RENDER_BACKENDS = {
+    "fluidsynth": render_fluidsynth,
+    "numpy": render_numpy,
+    "pool": render_pool,
+}
+
+
+def register_backend(name, render):
+    RENDER_BACKENDS[name] = render
+
+
+def stream_spectrum(
+    wavelength,
+    continuum=None,
+    emission=None,
+    absorption=None,
+    cosmic_rays=None,
+    chunk_seconds=0.25,
+    max_notes=None,
+    target_duration=None
+):
+    """Yield float32 PCM chunks (synth.SAMPLE_RATE, mono) in wavelength order as they are rendered.
+
+    Leading and trailing silence is dropped as the chunks go by (postprocess.trim_stream).
+    """
+    if target_duration is not None:
+        max_notes = notes_for_duration(target_duration)
+    tracks = note_schedule(wavelength, continuum, emission, absorption, cosmic_rays, max_notes)
+    chunk_size = int(chunk_seconds * synth.SAMPLE_RATE)
+    for chunk in postprocess.trim_stream(synth.stream_tracks(tracks, NOTE_DURATION * TICK_SECONDS, TICK_SECONDS, chunk_size)):
+        count("samples_rendered", len(chunk))
+        yield chunk
+
+
+@traced("sonify_spectrum_to_wav")
 def sonify_spectrum_to_wav(
     wavelength,
-    continuum,
-    emission,
-    absorption,
-    cosmic_rays,
+    continuum=None,
+    emission=None,
+    absorption=None,
+    cosmic_rays=None,
     midi_path="spectrum.mid",
     wav_path="spectrum.wav",
-    soundfont_path="FluidR3_GM.sf2"
+    soundfont_path="FluidR3_GM.sf2",
+    backend="fluidsynth",
+    max_notes=None,
+    target_duration=None
 ):
-    # Normalize data
-    def normalize(arr, out_min, out_max):
-        arr_min, arr_max = min(arr), max(arr)
-        return [int(out_min + (x - arr_min) / (arr_max - arr_min) * (out_max - out_min)) if arr_max != arr_min else out_min for x in arr]
-
-    # Initialize MIDI
-    mid = MidiFile()
-    tempo = 50000  # microseconds per beat (120 BPM)
-
-    # Continuum track (pad instrument for ambient sound)
-    track_bg = MidiTrack()
-    mid.tracks.append(track_bg)
-    track_bg.append(mido.MetaMessage('set_tempo', tempo=tempo))
-    track_bg.append(Message('program_change', program=90, channel=0))  # Pad 3 (polysynth)
-
-    # Emission track (bright instrument with longer note durations)
-    track_em = MidiTrack()
-    mid.tracks.append(track_em)
-    track_em.append(Message('program_change', program=73, channel=1))  # Choir (ambient-friendly)
-
-    # Absorption track (synth pad instrument for deep, atmospheric sound)
-    track_ab = MidiTrack()
-    mid.tracks.append(track_ab)
-    track_ab.append(Message('program_change', program=92, channel=2))  # String or Synth pad
-
-    # Cosmic ray track (soft percussion with delayed pings)
-    track_cosmic = MidiTrack()
-    mid.tracks.append(track_cosmic)
-    track_cosmic.append(Message('program_change', program=10, channel=3))  # Music Box
-
-    # Normalize values to MIDI pitch (21–108)
-    pitches_emission = normalize(emission, 50, 70)  # Emission (higher notes)
-    pitches_absorption = normalize(absorption, 28, 50)  # Absorption (lower notes)
-    velocities_bg = normalize(continuum, 40, 80)  # Background noise intensity
-    velocities_cosmic = normalize(cosmic_rays, 80, 127)  # Cosmic rays (higher velocity for impact)
-
-    # Note duration for smoother sound (longer duration for overlapping sounds)
-    note_duration = 500  # 500ms (0.5 seconds)
-
-    # Apply pitch bends for smoother transitions
-    pitch_bend_range = 8191  # Maximum allowed pitch bend
-
-    for i in range(len(wavelength)):
-        time = i * 100  # milliseconds between notes
-
-        # Background noise (if non-zero)
-        if continuum[i] != 0:
-            track_bg.append(Message('note_on', note=50, velocity=velocities_bg[i], time=0, channel=0))
-            track_bg.append(Message('note_off', note=50, velocity=0, time=note_duration, channel=0))
-
-        # Emission line (if non-zero)
-        elif emission[i] != 0:
-            track_em.append(Message('note_on', note=pitches_emission[i], velocity=70, time=0, channel=1))
-            track_em.append(Message('pitchwheel', pitch=pitch_bend_range, time=0, channel=1))
-            track_em.append(Message('note_off', note=pitches_emission[i], velocity=0, time=note_duration, channel=1))
-
-        # Absorption line (if non-zero)
-        elif absorption[i] != 0:
-            track_ab.append(Message('note_on', note=pitches_absorption[i], velocity=100, time=0, channel=2))
-            track_ab.append(Message('pitchwheel', pitch=pitch_bend_range, time=0, channel=2))
-            track_ab.append(Message('note_off', note=pitches_absorption[i], velocity=0, time=note_duration, channel=2))
-
-        # Cosmic ray spike (only if above threshold)
-        elif cosmic_rays[i] != 0:
-            velocity = velocities_cosmic[i] // 2
-            note = 85
-            delay = i * 100
-            track_cosmic.append(Message('note_on', note=note, velocity=velocity, time=delay, channel=3))
-            track_cosmic.append(Message('note_off', note=note, velocity=0, time=note_duration, channel=3))
-
-    mid.save(midi_path)
-
-    fs = FluidSynth(soundfont_path)
-    fs.midi_to_audio(midi_path, wav_path)
+    """Render the spectrum with the given backend.
 
-    print(f"✅ Saved: {midi_path} and {wav_path}")
+    The spectrum is the wavelength plus four component arrays, or a SpaxelSpectrum
+    passed as the first argument. By default every wavelength sample becomes a note. Pass max_notes, or a
+    target_duration in seconds, to decimate the spectrum to a bounded length first.
+    """
+    if target_duration is not None:
+        max_notes = notes_for_duration(target_duration)
+    with span("sonify.note_schedule"):
+        tracks = note_schedule(wavelength, continuum, emission, absorption, cosmic_rays, max_notes)
+    count("notes", sum(len(track.note) for track in tracks))
+    render = RENDER_BACKENDS[backend]
+    with span("sonify.render", backend=backend):
+        return render(tracks, midi_path, wav_path, soundfont_path)
 
 
 
 def remove_trailing_silence_from_wav(wav_path, silence_threshold=-40, chunk_size=10):
-    """Remove trailing silence from a WAV file."""
-
-    return 
-    audio = AudioSegment.from_wav(wav_path)
-
-    # Find where the sound ends by checking for silence
-    start_trim = len(audio)  # Start with the entire audio
-    for i in range(len(audio)-1, 0, -chunk_size):
-        chunk = audio[i - chunk_size:i]
-        if chunk.dBFS > silence_threshold:  # Check if the chunk is above the silence threshold
-            start_trim = i
-            break
+    """Remove trailing silence from a WAV file, in place.
 
-    trimmed_audio = audio[:start_trim]
-    trimmed_audio.export(f"{wav_path}", format="wav")
+    chunk_size is the RMS window in milliseconds; see postprocess.py for the in-memory
+    and streaming versions, which also normalize.
+    """
+    postprocess.process_wav(wav_path, threshold_db=silence_threshold, peak_db=None, leading=False,
+                            window_seconds=chunk_size / 1000)
     print(f"Trimmed audio saved as '{wav_path}'")
 
 # Example usage:
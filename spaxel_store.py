@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import numpy as np
+
+
+STORE_VERSION = 1
+ROWS_PER_BLOCK = 8  # rows of spaxels transposed per step while ingesting
+DONOTUSE = 1 << 10  # MaNGA DRP3PIXMASK bit for pixels that should not be used
+
+
+def store_path(filename):
+    return f"{filename}.store"
+
+
+def _source_identity(filename):
+    st = os.stat(filename)
+    return {"name": os.path.basename(filename), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class SpaxelStore:
+    """A LOGCUBE rewritten spaxel-major: flux[x, y] is one contiguous spectrum on disk.
+
+    Arrays are memory-mapped read-only, so opening a store costs nothing until spectra
+    are read, and a read touches only that spectrum's pages. Indexing follows
+    cube.get_spectrum(x, y) and the label cube.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.shape = tuple(self.manifest["shape"])
+        self.redshift = self.manifest["redshift"]
+        self.wave = np.load(os.path.join(path, "wave.npy"))
+        self.wave_rest = self.wave / (1 + self.redshift)
+        self.flux = self._open("flux")
+        self.ivar = self._open("ivar")
+        self.mask = self._open("mask")
+
+    def _open(self, name):
+        return np.load(os.path.join(self.path, self.manifest["arrays"][name]), mmap_mode='r')
+
+    def spectrum(self, x, y):
+        """(flux, ivar, mask) of one spaxel as views into the store, without copying."""
+        return np.asarray(self.flux[x, y]), np.asarray(self.ivar[x, y]), np.asarray(self.mask[x, y])
+
+    def lime_spectrum(self, x, y):
+        """A lime.Spectrum for one spaxel, for running the component inference without the cube."""
+        flux, ivar, mask = self.spectrum(x, y)
+        return lime_spectrum(self.wave, flux, ivar, mask, self.redshift)
+
+
+def lime_spectrum(wave, flux, ivar, mask=None, redshift=0.0):
+    """A lime.Spectrum from MaNGA-style arrays: inverse variance plus an optional DRP3PIXMASK."""
+    import lime
+    bad = ivar <= 0
+    if mask is not None:
+        bad |= (mask & DONOTUSE) != 0
+    err = np.where(bad, np.inf, 1 / np.sqrt(np.where(bad, 1, ivar)))
+    return lime.Spectrum(wave, flux, input_err=err, redshift=redshift, pixel_mask=bad)
+
+
+def ingest(filename, out_path=None, redshift=0.0):
+    """Rewrite the FLUX, IVAR, MASK and WAVE extensions of a LOGCUBE into a spaxel store.
+
+    Works through the cube a few rows at a time from a memory-mapped FITS file, so
+    memory use does not depend on the cube size. The store is built in a temporary
+    directory and renamed into place when complete.
+    """
+    from astropy.io import fits
+    out_path = out_path or store_path(filename)
+    tmp_path = f"{out_path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    start = time.perf_counter()
+    with fits.open(filename, memmap=True) as hdul:
+        nwave, ny, nx = hdul['FLUX'].data.shape
+        arrays = {}
+        for name, ext, dtype in (("flux", 'FLUX', np.float32), ("ivar", 'IVAR', np.float32), ("mask", 'MASK', np.int32)):
+            data = hdul[ext].data
+            out = np.lib.format.open_memmap(os.path.join(tmp_path, f"{name}.npy"), mode='w+', dtype=dtype, shape=(ny, nx, nwave))
+            for x0 in range(0, ny, ROWS_PER_BLOCK):
+                x1 = min(x0 + ROWS_PER_BLOCK, ny)
+                out[x0:x1] = np.asarray(data[:, x0:x1, :], dtype=dtype).transpose(1, 2, 0)
+            out.flush()
+            del out
+            arrays[name] = f"{name}.npy"
+        np.save(os.path.join(tmp_path, "wave.npy"), np.asarray(hdul['WAVE'].data, dtype=np.float64))
+        units_flux = hdul['FLUX'].header.get('BUNIT', '')
+
+    manifest = {
+        "version": STORE_VERSION,
+        "source": _source_identity(filename),
+        "shape": [ny, nx, nwave],
+        "layout": "spaxel-major: arrays are [x, y, wavelength], x, y as in cube.get_spectrum(x, y)",
+        "arrays": arrays,
+        "redshift": redshift,
+        "units_flux": units_flux,
+    }
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(out_path, ignore_errors=True)
+    os.replace(tmp_path, out_path)
+    print(f"✅ Saved: {out_path} ({ny * nx} spaxels in {time.perf_counter() - start:.1f} s)")
+    return out_path
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def open_store(filename):
+    """The SpaxelStore for a cube, or None if there is none or it is older than the FITS file.
+
+    Open stores are kept between calls; they are only memory maps.
+    """
+    path = store_path(filename)
+    try:
+        manifest_mtime = os.stat(os.path.join(path, "manifest.json")).st_mtime_ns
+    except OSError:
+        return None
+    key = (os.path.abspath(path), manifest_mtime)
+    with _stores_lock:
+        store = _stores.get(key)
+    if store is None:
+        store = SpaxelStore(path)
+        if store.manifest.get("version") != STORE_VERSION:
+            return None
+        with _stores_lock:
+            _stores[key] = store
+
+    if os.path.exists(filename):
+        source = _source_identity(filename)
+        if (source["size"], source["mtime_ns"]) != (store.manifest["source"]["size"], store.manifest["source"]["mtime_ns"]):
+            return None
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite MaNGA cubes into spaxel-major memory-mapped stores.")
+    parser.add_argument("cubes", nargs="+", help="LOGCUBE FITS files")
+    parser.add_argument("--force", action="store_true", help="rebuild stores that are already up to date")
+    args = parser.parse_args()
+
+    for cube_file in args.cubes:
+        if not args.force and open_store(cube_file) is not None:
+            print(f"{store_path(cube_file)} is up to date", file=sys.stderr)
+            continue
+        ingest(cube_file)
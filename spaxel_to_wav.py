@@ -1,93 +1,105 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import lime
+from cube_cache import get_cube
+from classify_cube import load_label_cube, UNCLASSIFIED
+from spaxel_store import open_store, lime_spectrum
+import regions
+from tracing import span, traced
+from spectrum import SpaxelSpectrum, continuum_inds, emission_inds, absorption_inds, cosmic_ray_inds  # the index groups used to be defined here
 from sonify import sonify_spectrum_to_wav, remove_trailing_silence_from_wav
-import numpy as np
-
-
-def get_spaxel_spectra(filename, x, y, plot=True):
-    
-    cube = lime.Cube.from_file(filename, instrument='manga')
-    
-    rest_wav = cube.wave_rest.data
-
-    spec = cube.get_spectrum(x, y)
-    spec.infer.components()
-
-    # Define classification indices
-    continuum_inds = np.array([0, 1, 2, 10])
-    emission_inds = np.array([3, 6, 7, 8])
-    absorption_inds = np.array([9, 11])
-    cosmic_ray_inds = np.array([4, 5])
-
-    # Get indices for each type
-    cont = np.where(np.isin(spec.infer.pred_arr, continuum_inds))
-    em = np.where(np.isin(spec.infer.pred_arr, emission_inds))
-    absr = np.where(np.isin(spec.infer.pred_arr, absorption_inds))
-    cr = np.where(np.isin(spec.infer.pred_arr, cosmic_ray_inds))
-
-    # Full flux array
-    flux = spec.flux.data
-
-    # Initialize all component arrays with zeros
-    continuum = np.zeros_like(flux)
-    emission = np.zeros_like(flux)
-    absorption = np.zeros_like(flux)
-    cosmic_ray = np.zeros_like(flux)
-
-    # Fill values at matched indices
-    continuum[cont] = flux[cont]
-    emission[em] = flux[em]
-    absorption[absr] = flux[absr]
-    cosmic_ray[cr] = flux[cr]
-
-    # Get wavelengths for dot plotting
-    cont_wav = rest_wav[cont]
-    em_wav = rest_wav[em]
-    absr_wav = rest_wav[absr]
-    cr_wav = rest_wav[cr]
-
-    # print(f"Length of rest_wav: {len(rest_wav)}")
-    # print(f"Length of flux: {len(flux)}")
-    # print(f"Length of continuum: {len(continuum)}")
-    # print(f"Length of emission: {len(emission)}")
-    # print(f"Length of absorption: {len(absorption)}")
-    # print(f"Length of cosmic_ray: {len(cosmic_ray)}")
-    # print(f"Length of cont_wav (nonzero): {len(cont_wav)}")
-    # print(f"Length of em_wav (nonzero): {len(em_wav)}")
-    # print(f"Length of absr_wav (nonzero): {len(absr_wav)}")
-    # print(f"Length of cr_wav (nonzero): {len(cr_wav)}")
-    # print()
-    # print("First 10 values:")
-    # print("rest_wav     :", rest_wav[:10])
-    # print("flux         :", flux[:10])
-    # print("continuum    :", continuum[:10])
-    # print("emission     :", emission[:10])
-    # print("absorption   :", absorption[:10])
-    # print("cosmic_ray   :", cosmic_ray[:10])
-    # print("cont wav     :", cont_wav[:10])
-    # print("emi wav      :", em_wav[:10])
-    # print("abs wav      :", absr_wav[:10])
-    # print("cr wav       :", cr_wav[:10])
+
+
+def extract_spaxel(filename, x, y):
+    """The spaxel's rest wavelengths and flux, plus its LiME spectrum when it was read from the cube (else None)."""
+
+    # Read from the spaxel-major store when there is one (python spaxel_store.py <cube>)
+    store = open_store(filename)
+    if store is not None:
+        with span("spaxel.get_spectrum", source="store"):
+            return store.wave_rest, store.spectrum(x, y)[0], None
+
+    # Cubes stay resident between clicks, see cube_cache.py
+    with span("spaxel.load_cube"):
+        cube = get_cube(filename)
+    with span("spaxel.get_spectrum", source="cube"):
+        spec = cube.get_spectrum(x, y)
+    return cube.wave_rest.data, spec.flux.data, spec
+
+
+def classify_spaxel(filename, x, y, spec=None):
+    """The spaxel's per-sample component predictions; spec is extract_spaxel's LiME spectrum, if any."""
+
+    # Use the precomputed label cube when available (python classify_cube.py <cube>)
+    labels = load_label_cube(filename)
+    if labels is not None and labels[x, y, 0] != UNCLASSIFIED:
+        with span("spaxel.classify", source="label_cube"):
+            return labels[x, y]
+    with span("spaxel.classify", source="inference"):
+        if spec is None:
+            spec = open_store(filename).lime_spectrum(x, y)
+        spec.infer.components()
+        return spec.infer.pred_arr
+
+
+@traced("get_spaxel_spectrum")
+def get_spaxel_spectrum(filename, x, y):
+    """The spaxel's flux and per-sample component labels as a SpaxelSpectrum."""
+    rest_wav, flux, spec = extract_spaxel(filename, x, y)
+    return SpaxelSpectrum.from_pred_arr(rest_wav, flux, classify_spaxel(filename, x, y, spec), x, y)
+
+
+@traced("get_region_spectra")
+def get_region_spectra(filename, groups, classify="infer"):
+    """One SpaxelSpectrum per region (boolean [x, y] masks or (xs, ys) lists, see regions.py).
+
+    Each region's spectra are co-added inverse-variance weighted in a single pass over
+    the cube, then classified once: classify="infer" runs the model on the co-added
+    spectrum, "labels" takes each sample's most common component in the label cube
+    instead, and "auto" uses the label cube when there is one.
+    """
+    groups = [regions.as_indices(group) for group in groups]
+    with span("spaxel.coadd", regions=len(groups)):
+        coadd = regions.coadd(filename, groups)
+
+    spectra = []
+    for (xs, ys), flux, ivar in zip(groups, coadd.flux, coadd.ivar):
+        labels = regions.vote_labels(filename, xs, ys) if classify != "infer" else None
+        if labels is not None:
+            spectra.append(SpaxelSpectrum(coadd.wave_rest, flux, labels))
+            continue
+        if classify == "labels":
+            raise ValueError(f"no label cube covering the region for {filename}")
+        with span("spaxel.classify", source="inference"):
+            spec = lime_spectrum(coadd.wave, flux, ivar, redshift=coadd.redshift)
+            spec.infer.components()
+        spectra.append(SpaxelSpectrum.from_pred_arr(coadd.wave_rest, flux, spec.infer.pred_arr))
+    return spectra
+
+
+def get_region_spectrum(filename, region, classify="infer"):
+    """A whole region (e.g. regions.circle(...)) as one classified SpaxelSpectrum."""
+    return get_region_spectra(filename, [region], classify)[0]
+
+
+def get_spaxel_spectra(filename, x, y, plot=True, plot_path="spectrum.png"):
+    """(rest_wav, flux, continuum, emission, absorption, cosmic_ray) with zero-filled component arrays.
+
+    Kept for callers that want plain arrays; get_spaxel_spectrum is the compact form.
+    """
+    spectrum = get_spaxel_spectrum(filename, x, y)
+    rest_wav, flux, continuum, emission, absorption, cosmic_ray = spectrum.as_arrays()
 
     if plot:
-        plt.figure(figsize=(12, 8))
-        plt.plot(rest_wav, flux, color='black', label='Observed')
-        plt.plot(cont_wav, continuum[cont], ".", color='blue', label='Continuum')
-        plt.plot(em_wav, emission[em], ".", color='red', label='Emission')
-        plt.plot(absr_wav, absorption[absr], ".", color='green', label='Absorption')
-        plt.plot(cr_wav, cosmic_ray[cr], ".", color='orange', label='Cosmic Ray')
-        plt.xlabel('Wavelength (Angstroms)')
-        plt.ylabel('Flux (1e-17 FLAM)')
-        plt.legend()
-        plt.title(f'Spectrum at x={x}, y={y}')
-        # plt.show()
-
-        plt.savefig("spectrum.png", bbox_inches='tight', pad_inches=0)
+        plot_spaxel_spectrum(rest_wav, flux, continuum, emission, absorption, cosmic_ray, x, y, plot_path)
 
     return rest_wav, flux, continuum, emission, absorption, cosmic_ray
 
 
+def plot_spaxel_spectrum(rest_wav, flux, continuum, emission, absorption, cosmic_ray, x, y, plot_path="spectrum.png"):
+    # Reuses one figure for every call, see spectrum_plot.py
+    from spectrum_plot import get_plotter
+    with span("spaxel.plot"):
+        get_plotter().save((rest_wav, flux, continuum, emission, absorption, cosmic_ray), x, y, plot_path)
+
+
 # # Run the function
 if __name__ == "__main__":
     rest_wav, flux, continuum, emission, absorption, cosmic_rays = get_spaxel_spectra("manga-7443-12703-LOGCUBE.fits", 40, 40)
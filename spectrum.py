@@ -0,0 +1,76 @@
+import numpy as np
+
+
+# Component groups of the lime pred_arr classes
+CONTINUUM, EMISSION, ABSORPTION, COSMIC_RAY = range(4)
+NO_COMPONENT = 255  # unknown classes and unclassified samples
+COMPONENT_NAMES = ("continuum", "emission", "absorption", "cosmic_ray")
+
+continuum_inds = np.array([0, 1, 2, 10])
+emission_inds = np.array([3, 6, 7, 8])
+absorption_inds = np.array([9, 11])
+cosmic_ray_inds = np.array([4, 5])
+
+# pred_arr class -> component group, for any uint8 class value
+COMPONENT_LUT = np.full(256, NO_COMPONENT, dtype=np.uint8)
+for _group, _inds in enumerate((continuum_inds, emission_inds, absorption_inds, cosmic_ray_inds)):
+    COMPONENT_LUT[_inds] = _group
+
+
+class SpaxelSpectrum:
+    """One spaxel's flux with a uint8 component label per sample.
+
+    Replaces the four zero-filled component copies: a component's samples are the ones
+    with its label and non-zero flux (the same samples the zero-filled arrays had as
+    non-zero), and their indices are computed once and cached.
+    """
+
+    __slots__ = ("wavelength", "flux", "labels", "x", "y", "_indices")
+
+    def __init__(self, wavelength, flux, labels, x=None, y=None):
+        self.wavelength = wavelength  # shared by every spaxel of a cube, never copied
+        self.flux = flux
+        self.labels = labels
+        self.x = x
+        self.y = y
+        self._indices = [None] * 4
+
+    @classmethod
+    def from_pred_arr(cls, wavelength, flux, pred_arr, x=None, y=None):
+        """Build from lime's per-sample classes (or a label cube row)."""
+        labels = COMPONENT_LUT[np.asarray(pred_arr).astype(np.uint8)]
+        return cls(wavelength, flux, labels, x, y)
+
+    def indices(self, component):
+        """Sample indices of one component (CONTINUUM, EMISSION, ABSORPTION or COSMIC_RAY)."""
+        if self._indices[component] is None:
+            self._indices[component] = np.flatnonzero((self.labels == component) & (self.flux != 0))
+        return self._indices[component]
+
+    def mask(self, component):
+        mask = np.zeros(len(self.flux), dtype=bool)
+        mask[self.indices(component)] = True
+        return mask
+
+    def component(self, component):
+        """Zero-filled full-length copy of one component, as get_spaxel_spectra used to return."""
+        values = np.zeros_like(self.flux)
+        idx = self.indices(component)
+        values[idx] = self.flux[idx]
+        return values
+
+    def as_arrays(self):
+        """(rest_wav, flux, continuum, emission, absorption, cosmic_ray), the get_spaxel_spectra tuple."""
+        return (self.wavelength, self.flux, *(self.component(k) for k in range(4)))
+
+    @property
+    def nbytes(self):
+        """Bytes owned by this spectrum (the shared wavelength grid is not counted)."""
+        return self.flux.nbytes + self.labels.nbytes + sum(i.nbytes for i in self._indices if i is not None)
+
+    def __len__(self):
+        return len(self.flux)
+
+    def __repr__(self):
+        counts = ", ".join(f"{name}={len(self.indices(k))}" for k, name in enumerate(COMPONENT_NAMES))
+        return f"SpaxelSpectrum(x={self.x}, y={self.y}, n={len(self.flux)}, {counts})"
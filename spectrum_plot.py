@@ -0,0 +1,71 @@
+import threading
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+COMPONENTS = [('Continuum', 'blue'), ('Emission', 'red'), ('Absorption', 'green'), ('Cosmic Ray', 'orange')]
+
+
+def _as_arrays(spectra):
+    return spectra.as_arrays() if hasattr(spectra, "as_arrays") else spectra
+
+
+class SpectrumPlotter:
+    """One Agg figure reused for every spaxel: new spectra only swap the line data.
+
+    Figures are never created per call (so nothing piles up in pyplot's registry), and
+    render_rgba hands back pixels directly for display without going through a file.
+    """
+
+    def __init__(self, figsize=(12, 8), dpi=100):
+        self.figsize = figsize
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize, dpi=dpi, layout='tight')
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        (self.flux_line,) = self.ax.plot([], [], color='black', label='Observed')
+        self.component_lines = [self.ax.plot([], [], ".", color=color, label=label)[0] for label, color in COMPONENTS]
+        self.ax.set_xlabel('Wavelength (Angstroms)')
+        self.ax.set_ylabel('Flux (1e-17 FLAM)')
+        self.ax.legend()
+        self.lock = threading.Lock()  # one figure, shared by all threads
+
+    def _update(self, rest_wav, flux, continuum, emission, absorption, cosmic_ray, x, y):
+        self.flux_line.set_data(rest_wav, flux)
+        for line, component in zip(self.component_lines, (continuum, emission, absorption, cosmic_ray)):
+            # Component samples are the non-zero entries
+            idx = np.nonzero(component)
+            line.set_data(rest_wav[idx], component[idx])
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.set_title(f'Spectrum at x={x}, y={y}')
+
+    def render_rgba(self, spectra, x, y, width, height):
+        """Plot spectra (a SpaxelSpectrum or the get_spaxel_spectra tuple) and return (height, width, 4) uint8 pixels."""
+        rest_wav, flux, continuum, emission, absorption, cosmic_ray = _as_arrays(spectra)
+        with self.lock:
+            self._update(rest_wav, flux, continuum, emission, absorption, cosmic_ray, x, y)
+            self.fig.set_size_inches(max(width, 1) / self.dpi, max(height, 1) / self.dpi)
+            self.canvas.draw()
+            return np.array(self.canvas.buffer_rgba())
+
+    def save(self, spectra, x, y, plot_path):
+        """Plot spectra into plot_path at the full figure size."""
+        rest_wav, flux, continuum, emission, absorption, cosmic_ray = _as_arrays(spectra)
+        with self.lock:
+            self._update(rest_wav, flux, continuum, emission, absorption, cosmic_ray, x, y)
+            self.fig.set_size_inches(*self.figsize)
+            self.fig.savefig(plot_path, bbox_inches='tight', pad_inches=0)
+
+
+_plotter = None
+_plotter_lock = threading.Lock()
+
+def get_plotter():
+    """Shared plotter, created on first use."""
+    global _plotter
+    with _plotter_lock:
+        if _plotter is None:
+            _plotter = SpectrumPlotter()
+        return _plotter
@@ -0,0 +1,235 @@
+import os
+import sys
+import time
+import pickle
+import argparse
+import threading
+import itertools
+import contextlib
+import subprocess
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+import numpy as np
+import synth
+
+
+# Sweep modes, numbered like the frontend's draw_cursor types
+DOWN, RIGHT, CLOCKWISE, OUT = range(4)
+MODES = {"down": DOWN, "right": RIGHT, "clockwise": CLOCKWISE, "out": OUT}
+CLOCKWISE_STEPS = 36  # 10 degrees per step, like the frontend's clock hand
+STEP_SECONDS = float(os.environ.get("COSMIC_SWEEP_STEP_SECONDS", 0.5))
+
+
+def sweep_steps(filename, mode, n_steps=None):
+    """Spaxels under the cursor at each step of a sweep, as (xs, ys) index lists.
+
+    Steps partition the spaxels with data: a band of rows (DOWN) or columns (RIGHT),
+    a 360 / n_steps degree wedge around the center (CLOCKWISE), or an annulus (OUT).
+    x runs across the frontend's image and y down it, as in get_spaxel_spectrum(x, y).
+    By default there is one step per row, column, 10 degrees or spaxel of radius.
+    """
+    from batch import valid_mask
+    valid = valid_mask(filename)
+    nx, ny = valid.shape
+    x, y = np.mgrid[:nx, :ny] + 0.5  # spaxel centers
+    cx, cy = nx / 2, ny / 2
+    radius = min(nx, ny) / 2
+    r = np.hypot(x - cx, y - cy)
+    if mode == DOWN:
+        pos, default = y / ny, ny
+    elif mode == RIGHT:
+        pos, default = x / nx, nx
+    elif mode == CLOCKWISE:
+        # y points down the image, so increasing angles turn clockwise on screen
+        angle = np.arctan2(y - cy, x - cx) % (2 * np.pi)
+        pos, default = np.where(r < radius, angle / (2 * np.pi), np.inf), CLOCKWISE_STEPS
+    elif mode == OUT:
+        pos, default = r / radius, int(radius)
+    else:
+        raise ValueError(f"unknown sweep mode {mode!r}")
+    n_steps = n_steps or default
+
+    step = np.floor(pos * n_steps)
+    step[~valid | (pos >= 1)] = -1
+    return [tuple(idx.tolist() for idx in np.nonzero(step == k)) for k in range(n_steps)]
+
+
+def render_step(filename, xs, ys, max_notes):
+    """Worker: co-add one step's spaxels into a single spectrum (see regions.py) and render it with the numpy synth.
+
+    The label cube classifies the co-added spectrum when there is one, else the model
+    runs on it once. A step that fails is silent.
+    """
+    from spaxel_to_wav import get_region_spectrum
+    from sonify import sonify_spectrum_to_wav
+    if len(xs) == 0:
+        return np.zeros(0, dtype=np.float32)
+    try:
+        spectrum = get_region_spectrum(filename, (xs, ys), classify="auto")
+    except Exception as e:
+        print(f"{filename}: sweep step of {len(xs)} spaxels skipped: {e}", file=sys.stderr)
+        return np.zeros(0, dtype=np.float32)
+    return sonify_spectrum_to_wav(spectrum, midi_path=None, wav_path=None, backend="numpy", max_notes=max_notes)
+
+
+# ===== Step workers =====
+# Plain `python sweep.py --worker` processes, like synth_pool.py's: multiprocessing's spawn
+# start method (the macOS default) would re-run the caller's __main__ in every worker, and
+# the frontend builds its window at import time.
+
+def worker_main():
+    """Run the (fn, args) jobs read from stdin until EOF, answering on stdout."""
+    # Keep the binary protocol on the original stdout; anything printed goes to stderr
+    proto_out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    proto_in = sys.stdin.buffer
+    while True:
+        try:
+            job_id, fn, args = pickle.load(proto_in)
+        except EOFError:
+            break
+        try:
+            result, error = fn(*args), None
+        except Exception as e:
+            result, error = None, repr(e)
+        pickle.dump((job_id, result, error), proto_out)
+        proto_out.flush()
+
+
+class StepWorker:
+    """One long-lived worker process and its in-flight jobs."""
+
+    def __init__(self):
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.pending = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+
+    def submit(self, job_id, fn, args):
+        future = Future()
+        with self._lock:
+            self.pending[job_id] = future
+            pickle.dump((job_id, fn, args), self.proc.stdin)
+            self.proc.stdin.flush()
+        return future
+
+    def _read_results(self):
+        while True:
+            try:
+                job_id, result, error = pickle.load(self.proc.stdout)
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self.pending.pop(job_id)
+            # Cancelled futures still get computed; their results are dropped
+            with contextlib.suppress(InvalidStateError):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(f"sweep worker failed: {error}"))
+
+        # Worker exited: fail whatever it still had queued
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            with contextlib.suppress(InvalidStateError):
+                future.set_exception(RuntimeError("sweep worker exited"))
+
+    @property
+    def queue_depth(self):
+        return len(self.pending)
+
+    def close(self, wait=True):
+        with contextlib.suppress(OSError):
+            self.proc.stdin.close()
+        if wait:
+            self.proc.wait()
+
+
+class StepPool:
+    """Executor-like pool of StepWorkers: submit(fn, *args) returns a Future.
+
+    fn and its arguments are pickled, so fn must be importable from a module (render_step).
+    """
+
+    def __init__(self, max_workers=None):
+        self.workers = [StepWorker() for _ in range(max_workers or os.cpu_count())]
+        self._ids = itertools.count()
+
+    def submit(self, fn, *args):
+        worker = min(self.workers, key=lambda w: w.queue_depth)
+        return worker.submit(next(self._ids), fn, args)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        for worker in self.workers:
+            if cancel_futures:
+                for future in list(worker.pending.values()):
+                    future.cancel()
+            worker.close(wait)
+
+
+def stream_sweep(filename, steps, step_seconds=STEP_SECONDS, executor=None, workers=None, lookahead=None):
+    """Yield the sweep's mix as float32 chunks of step_seconds, one per step, in order.
+
+    Steps are rendered in parallel on executor (a StepPool of `workers` processes by
+    default), at most `lookahead` steps ahead of the chunk being played.
+    Step k starts at k * step_seconds; its tail overlaps the following steps. Chunks are
+    clipped to [-1, 1] like stream_tracks.
+    """
+    from sonify import notes_for_duration
+    max_notes = notes_for_duration(step_seconds)
+    step_size = int(round(step_seconds * synth.SAMPLE_RATE))
+    pool = executor or StepPool(workers)
+    lookahead = lookahead or 2 * (workers or os.cpu_count())
+    pending = iter(steps)
+    futures = deque(pool.submit(render_step, filename, xs, ys, max_notes) for xs, ys in itertools.islice(pending, lookahead))
+    tail = np.zeros(0, dtype=np.float32)
+    try:
+        while futures:
+            wav = futures.popleft().result()
+            for xs, ys in itertools.islice(pending, 1):
+                futures.append(pool.submit(render_step, filename, xs, ys, max_notes))
+            buf = np.zeros(max(step_size, len(wav), len(tail)), dtype=np.float32)
+            buf[:len(tail)] += tail
+            buf[:len(wav)] += wav
+            yield np.clip(buf[:step_size], -1, 1)
+            tail = buf[step_size:]
+        if len(tail):
+            yield np.clip(tail, -1, 1)
+    finally:
+        for future in futures:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_sweep(filename, steps, wav_path=None, step_seconds=STEP_SECONDS, executor=None, workers=None):
+    """The whole sweep as one float32 buffer, written to wav_path if given."""
+    samples = np.concatenate([np.zeros(0, dtype=np.float32), *stream_sweep(filename, steps, step_seconds, executor, workers)])
+    if wav_path:
+        synth.write_wav(wav_path, samples)
+    return samples
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--worker"]:
+        worker_main()
+        sys.exit()
+    parser = argparse.ArgumentParser(description="Sonify a Right / Down / Clockwise / Out sweep across a MaNGA cube.")
+    parser.add_argument("cube", help="LOGCUBE FITS file")
+    parser.add_argument("--mode", choices=MODES, default="down", help="sweep direction (default: down)")
+    parser.add_argument("--steps", type=int, default=None, help="number of steps (default: one per row, column, 10 degrees or spaxel of radius)")
+    parser.add_argument("--step-seconds", type=float, default=STEP_SECONDS, help=f"audio per step (default: {STEP_SECONDS})")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("-o", "--out", default="sweep.wav", help="output WAV file (default: sweep.wav)")
+    args = parser.parse_args()
+
+    steps = sweep_steps(args.cube, MODES[args.mode], args.steps)
+    start = time.perf_counter()
+    samples = render_sweep(args.cube, steps, args.out, args.step_seconds, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    seconds = len(samples) / synth.SAMPLE_RATE
+    print(f"✅ Saved: {args.out} ({len(steps)} steps, {sum(len(xs) for xs, ys in steps)} spaxels, "
+          f"{seconds:.1f} s of audio in {elapsed:.1f} s, {seconds / elapsed if elapsed else 0:.1f}x real time)")
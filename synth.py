@@ -0,0 +1,199 @@
+import wave
+import numpy as np
+
+
+SAMPLE_RATE = 44100
+TABLE_SIZE = 2048
+VOICE_GAIN = 0.25  # headroom for several overlapping voices
+
+# Rough General MIDI stand-ins: harmonic amplitudes plus an attack/release (s) envelope.
+# decay > 0 gives a plucked / struck sound that fades while the note is held.
+INSTRUMENTS = {
+    90: dict(harmonics=[1, 1/2, 1/3, 1/4, 1/5, 1/6], attack=0.01, release=0.15, decay=0),  # Pad 3 (polysynth)
+    73: dict(harmonics=[1, 0.25, 0.08], attack=0.01, release=0.12, decay=0),  # Flute / choir
+    92: dict(harmonics=[1, 0.6, 0.35, 0.2], attack=0.01, release=0.2, decay=0),  # Bowed pad
+    10: dict(harmonics=[1, 0, 0.45, 0, 0.2], attack=0.002, release=0.3, decay=6.0),  # Music box
+}
+DEFAULT_INSTRUMENT = dict(harmonics=[1], attack=0.01, release=0.1, decay=0)
+
+# Pitchwheel range in semitones (General MIDI default)
+BEND_SEMITONES = 2
+# Expression changes are ramped over this long to avoid clicks
+EXPRESSION_RAMP_SECONDS = 0.005
+
+_tables = {}
+_notes = {}
+
+
+def wavetable(program):
+    """One cycle of the instrument's waveform, built once by adding its harmonics."""
+    if program not in _tables:
+        harmonics = INSTRUMENTS.get(program, DEFAULT_INSTRUMENT)["harmonics"]
+        phase = np.arange(TABLE_SIZE) * (2 * np.pi / TABLE_SIZE)
+        table = sum(a * np.sin((k + 1) * phase) for k, a in enumerate(harmonics))
+        _tables[program] = (table / np.abs(table).max()).astype(np.float32)
+    return _tables[program]
+
+
+def note_frequency(note, bend=None):
+    semitones = note - 69
+    if bend:
+        semitones = semitones + BEND_SEMITONES * bend / 8192
+    return 440.0 * 2 ** (semitones / 12)
+
+
+def _build_note(program, note, bend, n_held, sample_rate):
+    inst = INSTRUMENTS.get(program, DEFAULT_INSTRUMENT)
+    n_release = int(inst["release"] * sample_rate)
+    n = n_held + n_release
+    t = np.arange(n) / sample_rate
+
+    # Wavetable lookup at the note's frequency
+    step = note_frequency(note, bend) * TABLE_SIZE / sample_rate
+    idx = (np.arange(n) * step).astype(np.int64) % TABLE_SIZE
+    wav = wavetable(program)[idx]
+
+    # Attack ramp, optional exponential decay, then linear release after note_off
+    env = np.minimum(t / max(inst["attack"], 1 / sample_rate), 1.0)
+    if inst["decay"]:
+        env = env * np.exp(-inst["decay"] * t)
+    release = np.linspace(1.0, 0.0, n_release, endpoint=False)
+    env[n_held:] = env[n_held - 1] * release if n_held else release
+    return (wav * env).astype(np.float32)
+
+
+def note_wave(program, note, bend, n_held, sample_rate=SAMPLE_RATE, cache=True):
+    """Unit-velocity waveform of one note held for n_held samples, including its release tail.
+
+    Waves are cached per note; pass cache=False for one-off lengths such as sustained notes.
+    """
+    if not cache:
+        return _build_note(program, note, bend, n_held, sample_rate)
+    key = (program, note, bend, n_held, sample_rate)
+    if key not in _notes:
+        _notes[key] = _build_note(program, note, bend, n_held, sample_rate)
+    return _notes[key]
+
+
+def _expression_curve(changes, start, n, sample_rate):
+    """Gain (expression / 127) over samples [start, start + n) from (sample, value) changes."""
+    samples, values = changes
+    first = np.searchsorted(samples, start, side="right") - 1
+    last = np.searchsorted(samples, start + n, side="left")
+    level = np.concatenate([[values[first] if first >= 0 else 127], values[first + 1:last]]) / 127
+    bounds = np.concatenate([[start], samples[first + 1:last], [start + n]]) - start
+    curve = np.repeat(level.astype(np.float32), np.diff(bounds))
+    # Short moving average so steps become ramps
+    ramp = max(1, int(EXPRESSION_RAMP_SECONDS * sample_rate))
+    if ramp > 1 and len(curve) > ramp:
+        padded = np.concatenate([np.full(ramp, curve[0], dtype=np.float32), curve])
+        cumsum = np.cumsum(padded, dtype=np.float64)
+        curve = ((cumsum[ramp:] - cumsum[:-ramp]) / ramp).astype(np.float32)
+    return curve
+
+
+def _voice_wave(voice, default_held, sample_rate):
+    start, program, note, bend, gain, n_held, expression = voice
+    if n_held is None:
+        return gain * note_wave(program, note, bend, default_held, sample_rate)
+    wav = note_wave(program, note, bend, n_held, sample_rate, cache=False)
+    if expression is not None:
+        wav = wav * _expression_curve(expression, start, len(wav), sample_rate)
+    return gain * wav
+
+
+def _voices(tracks, tick_seconds, sample_rate):
+    """Every note as (start sample, program, note, bend, gain, held samples, expression), sorted by start.
+
+    Held samples is None for notes of the default length. Expression is the track's
+    (sample, value) changes for sustained notes, else None.
+    """
+    voices = []
+    for track in tracks:
+        starts = np.round(track.start * tick_seconds * sample_rate).astype(np.int64)
+        gains = track.velocity * (VOICE_GAIN / 127)
+        if track.duration is None:
+            voices += [(start, track.program, note, track.bend, gain, None, None)
+                       for start, note, gain in zip(starts.tolist(), track.note.tolist(), gains.tolist())]
+            continue
+        ends = np.round((track.start + track.duration) * tick_seconds * sample_rate).astype(np.int64)
+        expression = None
+        if track.expression is not None:
+            ticks, values = track.expression
+            expression = (np.round(np.asarray(ticks) * tick_seconds * sample_rate).astype(np.int64), np.asarray(values))
+        voices += [(start, track.program, note, track.bend, gain, end - start, expression)
+                   for start, end, note, gain in zip(starts.tolist(), ends.tolist(), track.note.tolist(), gains.tolist())]
+    voices.sort(key=lambda v: v[0])
+    return voices
+
+
+def _voices_end(voices, n_held):
+    """First sample after every voice's held part."""
+    return max((v[0] + (n_held if v[5] is None else v[5]) for v in voices), default=0)
+
+
+def _max_release(sample_rate):
+    return int(max(inst["release"] for inst in INSTRUMENTS.values()) * sample_rate)
+
+
+def render_tracks(tracks, note_seconds, tick_seconds, sample_rate=SAMPLE_RATE):
+    """Mix a note schedule (see sonify.note_schedule) into a mono float32 buffer."""
+    n_held = int(round(note_seconds * sample_rate))
+    voices = _voices(tracks, tick_seconds, sample_rate)
+    out = np.zeros(_voices_end(voices, n_held) + _max_release(sample_rate) + 1, dtype=np.float32)
+
+    for voice in voices:
+        wav = _voice_wave(voice, n_held, sample_rate)
+        start = voice[0]
+        out[start:start + len(wav)] += wav
+
+    # Scale down rather than clip if many voices pile up
+    peak = np.abs(out).max() if len(out) else 0
+    if peak > 1:
+        out /= peak
+    return out
+
+
+def stream_tracks(tracks, note_seconds, tick_seconds, chunk_size, sample_rate=SAMPLE_RATE):
+    """Like render_tracks, but yield the mix in chunk_size pieces as soon as each one is complete.
+
+    A chunk is final once every note starting before its end has been mixed in, so only
+    the notes overlapping the next chunk are ever rendered ahead. The total level is
+    unknown up front, so chunks are clipped to [-1, 1] instead of rescaled. Sustained
+    notes are mixed in whole, so per-note tracks keep the window (and latency) small.
+    """
+    n_held = int(round(note_seconds * sample_rate))
+    voices = _voices(tracks, tick_seconds, sample_rate)
+    if not voices:
+        return
+    total = _voices_end(voices, n_held) + _max_release(sample_rate) + 1
+    longest = max(n_held if v[5] is None else v[5] for v in voices)
+
+    # Window of [base, base + len(buf)) samples still being mixed
+    buf = np.zeros(chunk_size + longest + _max_release(sample_rate), dtype=np.float32)
+    base = 0
+    k = 0
+    while base < total:
+        chunk_end = base + chunk_size
+        while k < len(voices) and voices[k][0] < chunk_end:
+            wav = _voice_wave(voices[k], n_held, sample_rate)
+            start = voices[k][0]
+            buf[start - base:start - base + len(wav)] += wav
+            k += 1
+
+        yield np.clip(buf[:min(chunk_size, total - base)], -1, 1)
+
+        # Slide the window forward by one chunk
+        buf[:-chunk_size] = buf[chunk_size:]
+        buf[-chunk_size:] = 0
+        base = chunk_end
+
+
+def write_wav(path, samples, sample_rate=SAMPLE_RATE):
+    """Save float samples in [-1, 1], mono (n,) or multichannel (n, channels), as 16-bit PCM."""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1 if pcm.ndim == 1 else pcm.shape[1])
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
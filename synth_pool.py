@@ -0,0 +1,237 @@
+import os
+import sys
+import time
+import pickle
+import threading
+import itertools
+import subprocess
+from concurrent.futures import Future
+import numpy as np
+
+
+SAMPLE_RATE = 44100
+DEFAULT_WORKERS = int(os.environ.get("COSMIC_SYNTH_WORKERS", 2))
+TAIL_SECONDS = 1.0  # let the last notes ring out
+DRAIN_BLOCK = 1024  # samples rendered per step while draining effect tails between jobs
+DRAIN_BLOCKS = 5 * SAMPLE_RATE // DRAIN_BLOCK  # give up after 5 s of tail
+
+# Event kinds, in the order they are applied when they share a sample
+PROGRAM, NOTE_OFF, CC, NOTE_ON, BEND = range(5)
+EXPRESSION_CC = 11
+
+event_dtype = np.dtype([("sample", np.int64), ("kind", np.int8), ("channel", np.int8),
+                        ("data1", np.int16), ("data2", np.int16)])
+
+
+def synth_events(tracks, note_seconds, tick_seconds, sample_rate=SAMPLE_RATE):
+    """Flatten a note schedule (see sonify.note_schedule) into a time-sorted event array."""
+    n_held = int(round(note_seconds * sample_rate))
+    parts = []
+    for track in tracks:
+        starts = np.round(track.start * tick_seconds * sample_rate).astype(np.int64)
+        n = len(starts)
+        program = np.zeros(1, dtype=event_dtype)
+        program["kind"], program["channel"], program["data1"] = PROGRAM, track.channel, track.program
+        ons = np.zeros(n, dtype=event_dtype)
+        ons["sample"], ons["kind"], ons["channel"] = starts, NOTE_ON, track.channel
+        ons["data1"], ons["data2"] = track.note, track.velocity
+        offs = ons.copy()
+        if track.duration is None:
+            offs["sample"] += n_held
+        else:
+            offs["sample"] = np.round((track.start + track.duration) * tick_seconds * sample_rate)
+        offs["kind"], offs["data2"] = NOTE_OFF, 0
+        parts += [program, ons, offs]
+        if track.expression is not None:
+            ticks, values = track.expression
+            ccs = np.zeros(len(ticks), dtype=event_dtype)
+            ccs["sample"] = np.round(np.asarray(ticks) * tick_seconds * sample_rate)
+            ccs["kind"], ccs["channel"], ccs["data1"], ccs["data2"] = CC, track.channel, EXPRESSION_CC, values
+            parts.append(ccs)
+        if track.bend is not None:
+            bends = ons.copy()
+            bends["kind"], bends["data1"], bends["data2"] = BEND, track.bend, 0
+            parts.append(bends)
+    events = np.concatenate(parts)
+    return events[np.lexsort((events["kind"], events["sample"]))]
+
+
+# ===== Worker process =====
+
+def _reset(fs):
+    """Silence the previous job: system reset, all sound off and controllers reset on every
+    channel, then render and discard audio until the reverb and chorus tails are gone."""
+    import fluidsynth
+    if getattr(fluidsynth, "fluid_synth_system_reset", None):
+        fluidsynth.fluid_synth_system_reset(fs.synth)  # also clears the effect buffers
+    for channel in range(16):
+        fs.cc(channel, 120, 0)  # all sound off: voices stop without their release
+        fs.cc(channel, 121, 0)  # reset controllers
+        fs.pitch_bend(channel, 0)
+    for _ in range(DRAIN_BLOCKS):
+        if not np.any(fs.get_samples(DRAIN_BLOCK)):
+            break
+
+
+def _render_events(fs, sfid, events, n_tail):
+    """Step the synth through the events, returning int16 stereo PCM of shape (n, 2)."""
+    _reset(fs)
+
+    chunks = []
+    cursor = 0
+    for sample, kind, channel, data1, data2 in events.tolist():
+        if sample > cursor:
+            chunks.append(fs.get_samples(sample - cursor))
+            cursor = sample
+        if kind == NOTE_ON:
+            fs.noteon(channel, data1, data2)
+        elif kind == NOTE_OFF:
+            fs.noteoff(channel, data1)
+        elif kind == BEND:
+            fs.pitch_bend(channel, data1)
+        elif kind == CC:
+            fs.cc(channel, data1, data2)
+        else:
+            fs.program_select(channel, sfid, 0, data1)
+    chunks.append(fs.get_samples(n_tail))
+    return np.concatenate(chunks).astype(np.int16).reshape(-1, 2)
+
+
+def worker_main(soundfont_path, sample_rate):
+    """Load the SoundFont once, then render jobs read from stdin until EOF."""
+    import fluidsynth
+
+    # Keep the binary protocol on the original stdout; anything printed goes to stderr
+    proto_out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    proto_in = sys.stdin.buffer
+
+    fs = fluidsynth.Synth(samplerate=float(sample_rate))
+    sfid = fs.sfload(soundfont_path)
+    n_tail = int(TAIL_SECONDS * sample_rate)
+
+    while True:
+        try:
+            job_id, events = pickle.load(proto_in)
+        except EOFError:
+            break
+        start = time.perf_counter()
+        try:
+            result, error = _render_events(fs, sfid, events, n_tail), None
+        except Exception as e:
+            result, error = None, repr(e)
+        pickle.dump((job_id, result, error, time.perf_counter() - start), proto_out)
+        proto_out.flush()
+
+    fs.delete()
+
+
+# ===== Parent side =====
+
+class SynthWorker:
+    """One long-lived synth process, with its in-flight jobs and render-time stats."""
+
+    def __init__(self, soundfont_path, sample_rate):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", soundfont_path, str(sample_rate)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.pending = {}
+        self.jobs_done = 0
+        self.render_seconds = 0.0
+        self.last_render_seconds = 0.0
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+
+    def submit(self, job_id, events):
+        future = Future()
+        with self._lock:
+            self.pending[job_id] = future
+            pickle.dump((job_id, events), self.proc.stdin)
+            self.proc.stdin.flush()
+        return future
+
+    def _read_results(self):
+        while True:
+            try:
+                job_id, result, error, seconds = pickle.load(self.proc.stdout)
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self.pending.pop(job_id)
+                self.jobs_done += 1
+                self.render_seconds += seconds
+                self.last_render_seconds = seconds
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"synth worker failed: {error}"))
+
+        # Worker exited: fail whatever it still had queued
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("synth worker exited"))
+
+    @property
+    def queue_depth(self):
+        return len(self.pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pid": self.proc.pid,
+                "queue_depth": len(self.pending),
+                "jobs_done": self.jobs_done,
+                "render_seconds": self.render_seconds,
+                "mean_render_seconds": self.render_seconds / self.jobs_done if self.jobs_done else 0.0,
+                "last_render_seconds": self.last_render_seconds,
+            }
+
+    def close(self):
+        if self.proc.stdin:
+            self.proc.stdin.close()
+        self.proc.wait()
+
+
+class SynthPool:
+    """Pool of FluidSynth workers that keep the SoundFont loaded between renders."""
+
+    def __init__(self, size=DEFAULT_WORKERS, soundfont_path="FluidR3_GM.sf2", sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.workers = [SynthWorker(os.path.abspath(soundfont_path), sample_rate) for _ in range(size)]
+        self._ids = itertools.count()
+
+    def submit(self, events):
+        """Queue a render on the least busy worker; the future resolves to int16 (n, 2) PCM."""
+        worker = min(self.workers, key=lambda w: w.queue_depth)
+        return worker.submit(next(self._ids), events)
+
+    def render(self, tracks, note_seconds, tick_seconds):
+        events = synth_events(tracks, note_seconds, tick_seconds, self.sample_rate)
+        return self.submit(events).result()
+
+    def stats(self):
+        return [worker.stats() for worker in self.workers]
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(soundfont_path="FluidR3_GM.sf2"):
+    """Shared pool per SoundFont, started on first use."""
+    soundfont_path = os.path.abspath(soundfont_path)
+    with _pools_lock:
+        if soundfont_path not in _pools:
+            _pools[soundfont_path] = SynthPool(soundfont_path=soundfont_path)
+        return _pools[soundfont_path]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        worker_main(sys.argv[2], int(sys.argv[3]))
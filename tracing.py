@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+import statistics
+import contextlib
+from collections import defaultdict, deque
+
+
+# COSMIC_TRACE=1 keeps a rolling summary (printed on exit); any other value is also
+# the path the Chrome trace is written to on exit, e.g. COSMIC_TRACE=trace.json.
+# Open that file in chrome://tracing or https://ui.perfetto.dev.
+TRACE_ENV = os.environ.get("COSMIC_TRACE", "")
+MAX_EVENTS = 200_000  # oldest trace events are dropped beyond this
+ROLLING = 100  # durations kept per span name for the summary
+
+_NULL_SPAN = contextlib.nullcontext()
+_enabled = False
+_trace_path = None
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS)
+_durations = defaultdict(lambda: deque(maxlen=ROLLING))
+_totals = defaultdict(lambda: [0, 0.0])  # name -> [calls, seconds] since reset
+_counters = defaultdict(float)
+_origin_ns = time.perf_counter_ns()
+_pid = os.getpid()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        event = {"name": self.name, "ph": "X", "pid": _pid, "tid": threading.get_ident(),
+                 "ts": (self.start - _origin_ns) / 1000, "dur": (end - self.start) / 1000}
+        if self.args:
+            event["args"] = self.args
+        if exc_type is not None:
+            event.setdefault("args", {})["error"] = exc_type.__name__
+        seconds = (end - self.start) / 1e9
+        with _lock:
+            _events.append(event)
+            _durations[self.name].append(seconds)
+            total = _totals[self.name]
+            total[0] += 1
+            total[1] += seconds
+        return False
+
+
+def span(name, **args):
+    """Context manager timing one stage. A shared no-op when tracing is disabled."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator wrapping every call of a function in a span."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1):
+    """Add value to a named counter, e.g. MIDI events emitted or samples rendered."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += value
+        _events.append({"name": name, "ph": "C", "pid": _pid, "tid": threading.get_ident(),
+                        "ts": (time.perf_counter_ns() - _origin_ns) / 1000, "args": {name: _counters[name]}})
+
+
+def enable(trace_path=None):
+    global _enabled, _trace_path
+    _enabled = True
+    _trace_path = trace_path
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _durations.clear()
+        _totals.clear()
+        _counters.clear()
+
+
+def summary():
+    """Per span name: calls and total time since reset, plus percentiles over the last ROLLING calls."""
+    with _lock:
+        durations = {name: list(d) for name, d in _durations.items()}
+        totals = {name: tuple(t) for name, t in _totals.items()}
+        counters = dict(_counters)
+    spans = {}
+    for name, recent in durations.items():
+        recent.sort()
+        calls, total = totals[name]
+        spans[name] = {
+            "calls": calls,
+            "total_s": total,
+            "mean_ms": 1000 * statistics.fmean(recent),
+            "p50_ms": 1000 * recent[len(recent) // 2],
+            "p95_ms": 1000 * recent[min(len(recent) - 1, int(0.95 * len(recent)))],
+            "max_ms": 1000 * recent[-1],
+        }
+    return {"spans": spans, "counters": counters}
+
+
+def format_summary():
+    stats = summary()
+    lines = [f"{'span':32s} {'calls':>6s} {'total s':>9s} {'mean ms':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s}"]
+    for name, s in sorted(stats["spans"].items(), key=lambda item: -item[1]["total_s"]):
+        lines.append(f"{name:32s} {s['calls']:6d} {s['total_s']:9.3f} {s['mean_ms']:9.2f} "
+                     f"{s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['max_ms']:9.2f}")
+    for name, value in sorted(stats["counters"].items()):
+        lines.append(f"{name:32s} {value:.15g}")
+    return "\n".join(lines)
+
+
+def export_chrome_trace(path):
+    """Write the recorded spans and counters in Chrome trace event format."""
+    with _lock:
+        events = list(_events)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def _report():
+    if not _enabled:
+        return
+    if _trace_path:
+        export_chrome_trace(_trace_path)
+        print(f"Trace written to {_trace_path}", file=sys.stderr)
+    print(format_summary(), file=sys.stderr)
+
+
+if TRACE_ENV and TRACE_ENV != "0":
+    enable(None if TRACE_ENV == "1" else TRACE_ENV)
+atexit.register(_report)